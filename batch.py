@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""
+Run simulations without the GUI, e.g. on compute nodes:
+
+    python -m batch --steps 100000 --seed 1 --seed 2 --set update_milliseconds=20 --output results
+
+Neither Tkinter nor matplotlib are imported. For every seed, the runner writes a summary and the log of the run
+into the output directory. Traces are streamed to disk while the simulation runs (see tracefile.py); the JSON
+lines format writes the contents of the log after the run (see datalog.write_json_lines).
+
+A script (subtitles, CSV annotations or JSON lines cues, see model.transcripts) can be played along with every run:
+
+    python -m batch --steps 5000 --script session.srt --script-origin 4229767
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import argparse
+import json
+import os
+import time
+
+from configuration import APPTITLE, Settings
+from simulation import Simulation
+from model import api, transcripts
+import datalog
+import tracefile
+
+
+def apply_settings(overrides):
+    """Sets attributes of Settings from a list of 'key=value' strings, keeping the type of the default value"""
+    for override in overrides:
+        key, separator, value = override.partition("=")
+        key = key.strip()
+        if not separator or key.startswith("_") or not hasattr(Settings, key):
+            raise ValueError("unknown setting: %s" % override)
+        default = getattr(Settings, key)
+        if isinstance(default, bool):
+            value = value.strip().lower() in ("1", "true", "yes", "on")
+        elif isinstance(default, (int, float)):
+            value = type(default)(value)
+        setattr(Settings, key, value)
+
+
+def run(steps, seed, output, log_format="trace", fast_forward=False, instrument=False, schedule=None):
+    """Run a single simulation and write its results into the output directory; a compiled script is played
+    along with it. Returns the summary."""
+    simulation = Simulation(seed)
+    if schedule is not None:
+        simulation.play(schedule)
+    if instrument:
+        api.enable_instrumentation()
+    name = os.path.join(output, "seed_%s" % seed)
+
+    writer = None
+    if log_format == "trace":
+        writer = tracefile.TraceWriter(name + ".trace", simulation)
+        simulation.log.add_writer(writer)
+
+    start = time.time()
+    if fast_forward:
+        simulation.fast_forward(steps)
+    else:
+        for _ in range(steps):
+            if not simulation.step():
+                break
+    duration = time.time() - start
+
+    simulation.close()
+    if writer:
+        writer.close()
+    else:
+        with open(name + ".log.jsonl", "w") as log_file:
+            datalog.write_json_lines(simulation.log, log_file)
+
+    summary = {"seed": seed,
+               "steps": simulation.current_simstep,
+               "seconds": duration,
+               "steps_per_second": simulation.current_simstep / duration if duration else None,
+               "settings": {key: getattr(Settings, key) for key in dir(Settings) if not key.startswith("_")},
+               "final_state": api.get_data()}
+    if instrument:
+        summary["instrumentation"] = api.get_instrumentation()
+        api.disable_instrumentation()
+    with open(name + ".json", "w") as summary_file:
+        summary_file.write(json.dumps(summary, sort_keys=True, indent=4))
+    return summary
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run the %s without GUI." % APPTITLE)
+    parser.add_argument("--steps", type=int, default=1000, help="number of simulation steps per run")
+    parser.add_argument("--seed", type=int, action="append", dest="seeds",
+                        help="random seed; repeat the option for several runs (default: 0)")
+    parser.add_argument("--set", action="append", default=[], dest="settings", metavar="KEY=VALUE",
+                        help="override a value in configuration.Settings")
+    parser.add_argument("--output", default="results", help="directory for the results")
+    parser.add_argument("--format", choices=("trace", "jsonl"), default="trace",
+                        help="file format of the log (default: binary trace)")
+    parser.add_argument("--fast-forward", action="store_true",
+                        help="jump over quiescent periods; only their last step is logged")
+    parser.add_argument("--instrument", action="store_true",
+                        help="measure the stages of the model update, and add the results to the summary")
+    parser.add_argument("--arbitration", action="store_true",
+                        help="choose goals autonomously (see model.arbitration and the arbitration_* settings)")
+    parser.add_argument("--script", metavar="PATH",
+                        help="play a script along with every run (.srt, .vtt, .csv or .jsonl, see model.transcripts)")
+    parser.add_argument("--script-origin", type=float, default=0, metavar="MS",
+                        help="time of the script (in ms) that corresponds to the first step (default: 0)")
+    parser.add_argument("--emotions", metavar="NAME,...",
+                        help="compute and log only these emotions (default: all)")
+    args = parser.parse_args(args)
+
+    try:
+        apply_settings(args.settings)
+        if args.arbitration:
+            Settings.arbitration = True
+        if args.emotions:
+            api.observe_emotions(name.strip() for name in args.emotions.split(","))
+        schedule = transcripts.load(args.script, args.script_origin) if args.script else None
+    except (KeyError, ValueError, OSError) as error:
+        parser.error(str(error))
+
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+
+    for seed in args.seeds or [0]:
+        summary = run(args.steps, seed, args.output, args.format, args.fast_forward, args.instrument, schedule)
+        print("seed %s: %d steps in %.2f s" % (seed, summary["steps"], summary["seconds"]))
+        if args.instrument:
+            stages = summary["instrumentation"]["stages"]
+            print("    " + ", ".join("%s %.3f ms" % (name, 1000 * stage["mean_seconds"])
+                                     for name, stage in stages.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for the model tick and its stages, e.g.
+
+    python -m benchmark run --output baseline.json
+    python -m benchmark run --output current.json
+    python -m benchmark compare baseline.json current.json --threshold 0.1
+
+Every benchmark runs in a scenario with a number of additional needs (each with a consumption), active rewards
+(replaced whenever they expire) and anticipated events, and measures how often a function can be called per second. Scenarios run in their own
+population.Agent, so the additional elements do not leak into the model registries. compare exits with status 1
+if a benchmark got slower than the baseline by more than the threshold.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import argparse
+import io
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from configuration import APPTITLE
+import datalog
+from datalog import DataLog
+from simulation import Simulation
+from model import api, needs, modulators, events, emotions
+from model.population import Agent
+
+default_scenario = {"needs": 0, "rewards": 0, "events": 0}
+
+# scenarios vary one size at a time, starting from the default scenario
+sizes = {"needs": (0, 16, 64),
+         "rewards": (0, 100, 1000),
+         "events": (0, 100, 1000)}
+
+
+def setup(scenario, seed=0):
+    """Creates the additional elements of a scenario in the current registries, and returns a new simulation"""
+    for i in range(scenario["needs"]):
+        name = "benchmark_%d" % i
+        needs.Need(name, type="cognitive", initial_value=0.5, weight=0.5, decay=600)
+        needs.Consumption(name, name, reward=0.2, duration=2.0)
+    simulation = Simulation(seed)
+    simulation.trigger_probability = 0
+    simulation.triggers = []
+    consumption_names = list(needs.consumptions)
+    replenish_rewards(scenario)
+    for i in range(scenario["events"]):
+        api.create_event("benchmark_%d" % i, consumption_names[i % len(consumption_names)],
+                         expected_reward=0.5 if i % 2 else -0.5, certainty=0.5, skill=0.5, expiration=-1)
+    return simulation
+
+
+def replenish_rewards(scenario):
+    """Triggers small rewards with the default durations of the consumptions, until the number of active rewards
+    of the scenario is reached again. The rewards are spread evenly over the consumptions."""
+    consumption_list = list(needs.consumptions.values())
+    for i, consumption in enumerate(consumption_list):
+        count = len(range(i, scenario["rewards"], len(consumption_list)))
+        for _ in range(count - consumption.count_rewards()):
+            consumption.trigger(reward=0.001)
+
+
+def export_json(simulation, entries=100):
+    """Writes the last entries of the log as JSON lines into memory"""
+    log = simulation.log
+    datalog.write_json_lines(log, io.StringIO(), len(log) - entries)
+
+
+# benchmark name: (function of the simulation, number of operations per call)
+benchmarks = {"api.update": (lambda simulation: api.update(), 1),
+              "needs.update": (lambda simulation: needs.update(), 1),
+              "modulators.update": (lambda simulation: modulators.update(), 1),
+              "events.update": (lambda simulation: events.update(), 1),
+              "emotions.update": (lambda simulation: emotions.update(), 1),
+              "simulation.step": (lambda simulation: simulation.step(), 1),
+              "api.get_data": (lambda simulation: api.get_data(), 1),
+              "api.get_values": (lambda simulation: api.get_values(), 1),
+              "simulation._update_log": (lambda simulation: simulation._update_log(), 1),
+              "simulation.restore": (lambda simulation: simulation.restore(simulation.snapshot()), 1),
+              "export_json": (lambda simulation: export_json(simulation, 100), 100)}
+
+
+def call(function, simulation, scenario):
+    """Calls a benchmark function, after replacing the rewards of the scenario that have expired"""
+    replenish_rewards(scenario)
+    function(simulation)
+
+
+def measure(function, min_time=0.2, repeat=3):
+    """Returns the best number of calls per second of repeated runs, each taking at least min_time"""
+    best = 0
+    for _ in range(repeat):
+        calls = 0
+        start = time.perf_counter()
+        elapsed = 0
+        while elapsed < min_time:
+            function()
+            calls += 1
+            elapsed = time.perf_counter() - start
+        best = max(best, calls / elapsed)
+    return best
+
+
+def scenarios():
+    """All scenarios, as (label, scenario)"""
+    result = [("default", dict(default_scenario))]
+    for key, values in sizes.items():
+        for value in values:
+            if value != default_scenario[key]:
+                result.append(("%s=%d" % (key, value), dict(default_scenario, **{key: value})))
+    return result
+
+
+def run(names=None, min_time=0.2, repeat=3, warmup=100):
+    """Runs the benchmarks in all scenarios; returns a dict with the results and a description of the machine"""
+    results = {}
+    for label, scenario in scenarios():
+        for name in names or benchmarks:
+            function, operations = benchmarks[name]
+            with Agent():
+                simulation = setup(scenario)
+                simulation.log = DataLog(simulation, capacity=1000)
+                for _ in range(warmup):
+                    simulation.step()
+                calls_per_second = measure(lambda: call(function, simulation, scenario), min_time, repeat)
+            results["%s[%s]" % (name, label)] = {"benchmark": name,
+                                                 "scenario": scenario,
+                                                 "per_second": calls_per_second * operations}
+    return {"machine": {"python": sys.version.split()[0],
+                        "numpy": np.__version__,
+                        "platform": platform.platform(),
+                        "processor": platform.processor()},
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results}
+
+
+def compare(baseline, current, threshold=0.1):
+    """Compares two result files; returns a list of (key, baseline per second, current per second, change), and
+    the keys of the regressions, i.e. benchmarks that are slower by more than the threshold (a fraction)"""
+    rows = []
+    regressions = []
+    for key, result in sorted(current["results"].items()):
+        if key not in baseline["results"]:
+            continue
+        before = baseline["results"][key]["per_second"]
+        after = result["per_second"]
+        change = after / before - 1 if before else 0.0
+        rows.append((key, before, after, change))
+        if change < -threshold:
+            regressions.append(key)
+    return rows, regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the %s." % APPTITLE)
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and write the results")
+    run_parser.add_argument("--output", default="benchmark.json", help="JSON file for the results")
+    run_parser.add_argument("--benchmark", action="append", dest="names", choices=sorted(benchmarks),
+                            help="run only this benchmark; repeat the option for several (default: all)")
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="minimal duration of a measurement in s")
+    run_parser.add_argument("--repeat", type=int, default=3, help="number of measurements; the best one counts")
+
+    compare_parser = commands.add_parser("compare", help="compare results with a baseline")
+    compare_parser.add_argument("baseline", help="JSON file with the baseline results")
+    compare_parser.add_argument("current", help="JSON file with the current results")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="relative slowdown that counts as a regression (default: 0.1)")
+    args = parser.parse_args(args)
+
+    if args.command == "run":
+        results = run(args.names, args.min_time, args.repeat)
+        with open(args.output, "w") as output:
+            output.write(json.dumps(results, sort_keys=True, indent=4))
+        for key, result in sorted(results["results"].items()):
+            print("%-45s %12.1f/s" % (key, result["per_second"]))
+        print("results written to %s" % args.output)
+        return 0
+
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        rows, regressions = compare(json.load(baseline_file), json.load(current_file), args.threshold)
+    for key, before, after, change in rows:
+        print("%-45s %12.1f/s %12.1f/s %+7.1f%%%s" % (key, before, after, 100 * change,
+                                                     "  REGRESSION" if key in regressions else ""))
+    if regressions:
+        print("%d of %d benchmarks are more than %d%% slower" % (len(regressions), len(rows), 100 * args.threshold))
+        return 1
+    print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
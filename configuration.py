@@ -13,6 +13,17 @@ VERSION = "0.1"
 class Settings():
     update_milliseconds = 40  # 25 frames/s
     max_simulation_steps = 1000000
+    log_capacity = 50000  # number of entries kept in the log; older ones are overwritten
+    log_decimation = 1  # record only every n-th simulation step
+    speed = 1.0  # simulated time per real time while running; 0 runs as fast as possible
+    frame_rate = 25  # display updates per second
+    plot_frame_rate = 5  # diagram updates per second
+    instrumentation = False  # measure the stages of the model update, and show them in the status bar
+    color_values = False  # show the values of needs and emotions as the fill colour of their circles
+    arbitration = False  # choose goals autonomously from rollouts of the anticipated events
+    arbitration_horizon = 50  # number of steps of a rollout when goals are chosen autonomously
+    arbitration_budget = 0.02  # time for choosing a goal, in s
+    arbitration_workers = 0  # number of processes for the rollouts; 0 runs them in the simulation process
 
     fullscreen = False
 
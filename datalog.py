@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+Columnar log of the simulation values
+
+Only the dynamic values of the elements are logged (see api.dynamic_fields); their static properties are kept
+once, in the schema of the log, and anticipated events are not logged at all. The JSON exports (write_json,
+write_json_lines) use format 2: a header with the schema and the seed of the run (with the parameters of the random
+triggers, which are needed to reproduce it) and the number of older entries that the log has already overwritten
+(dropped_entries), followed by one row [step, values...] per entry, in the
+order of the columns of the schema. Format 1, written before the log existed, was a list of api.get_data() dicts
+per step, with the static properties and the events; api.rehydrate() turns a row into such a dict, without events.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import json
+
+import numpy as np
+
+from configuration import Settings
+from model import api
+
+# fields that change during the simulation; everything else is static and does not need to be logged.
+# Emotions that are not observed (see emotions.observe) are not computed, and not logged either.
+logged_fields = api.dynamic_fields
+
+JSON_FORMAT = 2
+
+
+class DataLog(object):
+    """Keeps the history of the simulation in a preallocated ring buffer, with one float array per
+    (category, element, field). Only every n-th step is recorded, according to the decimation.
+    When the capacity is exhausted, the oldest entries are overwritten.
+    The static properties of the elements are kept once, in the schema (see api.get_schema)."""
+
+    def __init__(self, simulation, capacity=None, decimation=None):
+        self.capacity = capacity or Settings.log_capacity
+        self.decimation = max(1, decimation or Settings.log_decimation)
+
+        self.schema = api.get_schema()
+        self.seed = simulation.seed
+        self.trigger_probability = simulation.trigger_probability
+        self.block_size = simulation.block_size
+        self.columns = [tuple(column) for column in self.schema["columns"]]  # (category, element, field)
+        elements = {(category, element.name): element
+                    for category, _ in logged_fields for element in getattr(simulation, category)}
+        # (object, attribute) from which we read the values
+        self.sources = [(elements[(category, name)], field) for category, name, field in self.columns]
+        self.index = {column: i for i, column in enumerate(self.columns)}
+
+        self.data = np.zeros((len(self.columns), self.capacity))
+        self.steps = np.zeros(self.capacity, dtype=np.int64)
+        self.count = 0  # number of entries recorded so far, including the overwritten ones
+        self.writers = []  # receive every recorded entry, e.g. tracefile.TraceWriter
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def record(self, step, force=False):
+        """Store the current values of the simulation, if the step is not skipped by the decimation"""
+        if step % self.decimation and not force:
+            return
+        i = self.count % self.capacity
+        values = [getattr(element, field) for element, field in self.sources]
+        self.steps[i] = step
+        self.data[:, i] = values
+        self.count += 1
+        for writer in self.writers:
+            writer.append(step, values)
+
+    def add_writer(self, writer):
+        """Streams all entries recorded from now on into the writer"""
+        self.writers = self.writers + [writer]
+
+    def remove_writer(self, writer):
+        # replace the list instead of changing it, so that writers can be removed from another thread while
+        # record() iterates over them
+        self.writers = [w for w in self.writers if w is not writer]
+
+    def clear(self):
+        self.count = 0
+
+    def dropped(self):
+        """Returns the number of recorded entries that have been overwritten"""
+        return max(0, self.count - self.capacity)
+
+    def _chronological(self, array, last=None):
+        """Returns the entries of an array in the order they were recorded; a view unless the buffer wrapped"""
+        n = len(self)
+        if last is not None:
+            n = min(n, last)
+        end = self.count % self.capacity if self.count > self.capacity else self.count
+        start = end - n
+        if start >= 0:
+            return array[..., start:end]
+        return np.concatenate((array[..., start:], array[..., :end]), axis=-1)
+
+    def get_steps(self, last=None):
+        """Returns the simulation steps of the recorded entries, oldest first"""
+        return self._chronological(self.steps, last)
+
+    def get(self, category, element, field="value", last=None):
+        """Returns the recorded values of a field of an element, oldest first, e.g. get("needs", "food")"""
+        return self._chronological(self.data[self.index[(category, element, field)]], last)
+
+    def get_block(self, start, stop):
+        """Returns the steps and an array of values (one row per column) for a range of entries,
+        counted from the oldest one"""
+        n = len(self)
+        positions = np.arange(max(0, start), min(n, stop))
+        i = (self.count - n + positions) % self.capacity
+        return self.steps[i], self.data[:, i]
+
+    def get_entry(self, position, static=False):
+        """Returns a recorded entry as a dict of dicts, in the layout of api.get_data(), with the static
+        properties of the elements if static is set; position counts from the oldest entry, negative positions
+        from the newest one"""
+        n = len(self)
+        if position < 0:
+            position += n
+        if not 0 <= position < n:
+            raise IndexError("log position out of range")
+        i = (self.count - n + position) % self.capacity
+        return api.rehydrate(self.data[:, i], self.schema, int(self.steps[i]), static)
+
+    def entries(self):
+        """Iterates over all recorded entries as dicts, oldest first"""
+        for position in range(len(self)):
+            yield self.get_entry(position)
+
+    def rows(self, start=0, chunk_size=4096):
+        """Iterates over the recorded entries from start on as lists [step, values...], oldest first,
+        reading the log in chunks"""
+        for first in range(max(0, start), len(self), chunk_size):
+            steps, values = self.get_block(first, first + chunk_size)
+            for step, row in zip(steps.tolist(), values.T.tolist()):
+                yield [step] + row
+
+    def get_header(self):
+        """The header of the JSON exports"""
+        return {"format": JSON_FORMAT,
+                "update_milliseconds": Settings.update_milliseconds,
+                "decimation": self.decimation,
+                "dropped_entries": self.dropped(),
+                "seed": self.seed,
+                "trigger_probability": self.trigger_probability,
+                "block_size": self.block_size,
+                "schema": self.schema}
+
+
+def write_json(log, file, start=0):
+    """Writes the entries of the log into an open text file, as a JSON object with the header and a list of rows"""
+    header = json.dumps(log.get_header(), sort_keys=True)
+    file.write(header[:-1] + ', "rows": [')
+    for i, row in enumerate(log.rows(start)):
+        file.write(",\n" if i else "\n")
+        file.write(json.dumps(row))
+    file.write("\n]}\n")
+
+
+def write_json_lines(log, file, start=0):
+    """Writes the entries of the log into an open text file, as JSON lines: the header, then one row per line"""
+    file.write(json.dumps(log.get_header(), sort_keys=True))
+    file.write("\n")
+    for row in log.rows(start):
+        file.write(json.dumps(row))
+        file.write("\n")
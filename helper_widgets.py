@@ -7,6 +7,7 @@ More Tkinter UI definition
 __author__ = 'joscha'
 __date__ = '3/15/16'
 
+import time
 from tkinter import *
 from tkinter import ttk
 from configuration import Settings
@@ -107,6 +108,40 @@ class SimFrame(Frame):
         pane.rowconfigure(0, weight=1)
 
 
+class CanvasUpdater(object):
+    """Collects changes to the options of canvas items (e.g. the text of a label) and sends them to Tk in a
+    single call. The last value of every option is cached, so unchanged items do not cost a Tcl round trip."""
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.shown = {}  # (item, option): value as displayed
+        self.pending = {}  # (item, option): value to be displayed at the next flush
+
+    def set(self, item, option, value):
+        """Display the value (a string) for an option of a canvas item, e.g. set(label, "text", "0.5")"""
+        key = (item, option)
+        if self.shown.get(key) != value:
+            self.pending[key] = value
+        else:
+            self.pending.pop(key, None)
+
+    def flush(self):
+        """Send all pending changes to the canvas"""
+        if not self.pending:
+            return
+        path = str(self.canvas)
+        script = "\n".join("%s itemconfigure %s -%s {%s}" % (path, item, option, value)
+                           for (item, option), value in self.pending.items())
+        self.canvas.tk.eval(script)
+        self.shown.update(self.pending)
+        self.pending.clear()
+
+    def clear(self):
+        """Forget the displayed values, e.g. after the items have been deleted"""
+        self.shown.clear()
+        self.pending.clear()
+
+
 class ConfigDialog(Toplevel):
     def __init__(self, parent=None, *args, **kwargs):
         Toplevel.__init__(self, parent, *args, **kwargs)
@@ -239,6 +274,8 @@ class MainMenu(Menu):
         menu_simulation.add_command(label='Run', command = app.run_simulation)
         menu_simulation.add_command(label='Reset', command=app.reset_simulation)
         menu_simulation.add_command(label='Save data...', command=app.export_simulation_data)
+        menu_simulation.add_command(label='Record to trace...', command=app.record_trace)
+        menu_simulation.add_command(label='Stop recording', command=app.stop_recording)
 
         menu_help.add_command(label='Contact', command=app.show_contact)
 
@@ -249,6 +286,14 @@ class Diagram(Toplevel):
     data: where we get our values from
     key: the key of the plot window, must be unique
     title: optional window title
+
+    The artists of the diagram (lines, bars) are created once in setup(), and plot() only changes their data.
+    They are drawn with blitting over a cached background of axes and labels, which is only redrawn when
+    plot() changes the axes (e.g. the limits), or when the axes have moved (e.g. the window was resized).
+    Redraws happen at most Settings.plot_frame_rate times per second.
+
+    The simulation may be running in another thread, so drawing happens in two parts: sample() copies the data
+    of the diagram while the caller holds the lock of the runner, and draw_sample() draws it afterwards.
     """
 
     window_title = "Diagram"
@@ -259,35 +304,106 @@ class Diagram(Toplevel):
 
         self.parent = parent
         self.title(self.window_title)
-        self.bind("<Destroy>", self.destroy)
-
-        self.simulation = simulation
+        self.bind("<Destroy>", self.on_destroy)
 
         figure = plt.Figure(figsize=(5, 4), dpi=100)
-        self.subplot = figure.add_subplot(111)
 
         plt.ion()
 
-        self.canvas = FigureCanvasTkAgg(figure, master=self)
-        self.canvas.show()
-        self.canvas.get_tk_widget().pack(side=TOP, fill=BOTH, expand=1)
-
-        self.update_diagram()
+        canvas = FigureCanvasTkAgg(figure, master=self)
+        canvas.get_tk_widget().pack(side=TOP, fill=BOTH, expand=1)
 
+        self.setup_figure(simulation, canvas)
 
-    def update_diagram(self):
-        """re-reads the datasource and redraws the diagram accordingly"""
-        self.plot()
-        self.canvas.draw()
-
-    def plot(self):
-        """overwrite this method to produce a different diagram type"""
-        data = self.simulation.log
-        if len(data):
-            values = [step["needs"]["food"]["value"] for step in data]
-            self.subplot.plot(values, color="orange", linewidth=1.0)
+    def setup_figure(self, simulation, canvas):
+        """Creates the diagram on the figure of a matplotlib canvas. This does not need the window, so diagrams
+        can also be drawn on other canvases, e.g. FigureCanvasAgg."""
+        self.simulation = simulation
+        self.canvas = canvas
+        self.subplot = canvas.figure.add_subplot(111)
+
+        self.artists = []  # animated artists, drawn on top of the background
+        self.writers = []  # summaries that receive the entries of the log, see attach()
+        self.background = None
+        self.background_bounds = None  # where the axes were when the background was stored
+        self.last_redraw = 0
+        self.setup()
+        for artist in self.artists:
+            artist.set_animated(True)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+
+    def setup(self):
+        """overwrite this method to create the artists of a different diagram type"""
+        self.line, = self.subplot.plot([], [], color="orange", linewidth=1.0)
+        self.subplot.set_ylim(0, 1)
+        self.artists = [self.line]
+
+    def sample(self):
+        """overwrite this method to produce a different diagram type.
+        Returns a copy of the data that plot() needs; it must not share memory with the log or its summaries."""
+        return self.simulation.log.get("needs", "food", "value").copy()
+
+    def plot(self, values):
+        """overwrite this method to produce a different diagram type.
+        Updates the data of the artists from a sample; returns True if the axes have changed and need to be
+        redrawn."""
+        self.line.set_data(range(len(values)), values)
+        if len(values) > self.subplot.get_xlim()[1]:
+            self.subplot.set_xlim(0, 2 * len(values))
+            return True
+        return False
+
+    def is_due(self, force=False):
+        """True if the diagram may be redrawn, i.e. if the last redraw is not too recent"""
+        return force or time.perf_counter() - self.last_redraw >= 1.0 / Settings.plot_frame_rate
+
+    def update_diagram(self, force=False):
+        """re-reads the datasource and redraws the diagram accordingly, unless the last redraw was too recent.
+        Use sample() and draw_sample() instead while the simulation is running in another thread."""
+        if self.is_due(force):
+            self.draw_sample(self.sample())
+
+    def draw_sample(self, data):
+        """redraws the diagram with the data of a sample()"""
+        self.last_redraw = time.perf_counter()
+        rescale = self.plot(data)
+        if rescale or self.background is None or self.subplot.bbox.bounds != self.background_bounds:
+            self.canvas.draw()  # calls on_draw
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_artists()
+            self.canvas.blit(self.subplot.bbox)
+
+    def on_draw(self, event):
+        """after a full redraw, e.g. when the window is resized, store the background and add the artists"""
+        self.background = self.canvas.copy_from_bbox(self.subplot.bbox)
+        self.background_bounds = self.subplot.bbox.bounds
+        self.draw_artists()
+
+    def draw_artists(self):
+        for artist in self.artists:
+            self.subplot.draw_artist(artist)
+
+    def attach(self, writer):
+        """Let a summary (see summaries.py) receive all entries of the log while the diagram is open"""
+        self.simulation.log.add_writer(writer)
+        self.writers.append(writer)
+        return writer
+
+    def detach(self):
+        """Stop feeding the summaries of the diagram"""
+        for writer in self.writers:
+            self.simulation.log.remove_writer(writer)
+        self.writers = []
+
+    def on_destroy(self, event):
+        """the window is closed; Tk also sends <Destroy> for the widgets within the window, which we ignore"""
+        if str(event.widget) == str(self):
+            if self.parent.open_diagrams.get(self.key) is self:
+                del self.parent.open_diagrams[self.key]  # remove from index of open plot windows
+            self.detach()
 
     def destroy(self):
-        self.parent.open_diagrams.pop(self.key, None)  # remove from index of open plot windows
-        Toplevel.destroy(self)
+        self.detach()
+        Toplevel.destroy(self)  # calls on_destroy
 
@@ -8,9 +8,18 @@ __author__ = 'joscha'
 __date__ = '3/14/16'
 
 from model import agent, needs, modulators
-from model import events, emotions
+from model import events, emotions, goals
+from model.instrumentation import Instrumentation
 
 step = 0
+instrumentation = None  # measures the stages of update(), see enable_instrumentation()
+
+# fields of the elements that change during the simulation, in the order of get_values(); everything else is static
+dynamic_fields = (("needs", ("value", "urge", "urgency", "pain", "pleasure")),
+                  ("consumptions", ("value",)),
+                  ("modulators", ("value",)),
+                  ("aggregates", ("value",)),
+                  ("emotions", ("value",)))
 
 
 def reset():
@@ -27,12 +36,58 @@ def update():
     """Call this in every simulation cycle"""
     global step
     step += 1
+    if instrumentation is not None:
+        instrumentation.run((("needs", needs.update),
+                             ("modulators", modulators.update),
+                             ("events", events.update),
+                             ("emotions", emotions.update)))
+        instrumentation.count(needs.consumptions.values(), events.events)
+        return
     needs.update()
     modulators.update()
     events.update()
     emotions.update()
 
 
+def enable_instrumentation():
+    """Start measuring the time of the stages of update(), the active rewards and events; resets the measurements"""
+    global instrumentation
+    instrumentation = Instrumentation()
+
+
+def disable_instrumentation():
+    global instrumentation
+    instrumentation = None
+
+
+def get_instrumentation():
+    """Returns the measurements of update() as a dict, or None if the instrumentation is not enabled"""
+    return instrumentation.get_data() if instrumentation is not None else None
+
+
+def is_quiescent():
+    """True if nothing but the decay of the needs changes the agent: no active rewards, no anticipated events,
+    and modulators that follow their targets immediately (volatility 1), so they do not carry a history"""
+    return (not events.events and goals.goal is None and
+            not any(c.reward_queues for c in needs.consumptions.values()) and
+            all(m.volatility == 1 for m in modulators.modulators.values()))
+
+
+def fast_forward(max_steps):
+    """Advance by up to max_steps in a single jump, if the agent is quiescent. The needs decay in closed form,
+    and the last step is a regular update, which recomputes urges, modulators and emotions (all observed emotions,
+    even if emotions.epsilon is set), so the result matches stepping within floating point tolerance.
+    Returns the number of steps taken; 0 means that the agent has to be updated step by step."""
+    global step
+    if max_steps < 2 or not is_quiescent():
+        return 0
+    needs.skip(max_steps - 1)
+    step += max_steps - 1
+    emotions.reset()  # the inputs changed in the jump, so the emotions must not skip the update
+    update()
+    return max_steps
+
+
 def get_needs():
     """Returns a dict of dicts with the agent's needs"""
     return needs.get_needs()
@@ -63,8 +118,73 @@ def get_emotions():
     return emotions.get_emotions()
 
 
+def observe_emotions(names=None):
+    """Only compute the given emotions in every update (e.g. the ones that are logged); None observes all"""
+    emotions.observe(names)
+
+
+def _elements(category):
+    """The elements of a category in the order of the schema; emotions that are not observed are left out"""
+    if category == "needs":
+        return needs.needs.values()
+    if category == "consumptions":
+        return needs.consumptions.values()
+    if category == "modulators":
+        return modulators.modulators.values()
+    if category == "aggregates":
+        return modulators.aggregates.values()
+    return [e for e in emotions.emotions.values() if emotions.is_observed(e.name)]
+
+
+def get_schema():
+    """Returns the static properties of all elements, and the columns (category, element, field) of the values
+    returned by get_values(). The schema only changes if elements are added or emotions observed."""
+    return {"needs": [{"name": n.name, "type": n.type, "weight": n.weight, "decay": n.decay,
+                       "gain": n.gain, "loss": n.loss} for n in _elements("needs")],
+            "consumptions": [{"name": c.name, "need": c.need.name,
+                              "type": "aversive" if c.default_reward < 0 else "appetitive",
+                              "reward": c.default_reward, "duration": c.default_duration}
+                             for c in _elements("consumptions")],
+            "modulators": [{"name": m.name, "baseline": m.baseline, "min": m.min, "max": m.max}
+                           for m in _elements("modulators")],
+            "aggregates": [{"name": a.name} for a in _elements("aggregates")],
+            "emotions": [{"name": e.name} for e in _elements("emotions")],
+            "columns": [[category, element.name, field]
+                        for category, fields in dynamic_fields
+                        for element in _elements(category)
+                        for field in fields]}
+
+
+def get_values():
+    """Returns the dynamic values of all elements as a tuple, in the order of the columns of get_schema()"""
+    return tuple(getattr(element, field)
+                 for category, fields in dynamic_fields
+                 for element in _elements(category)
+                 for field in fields)
+
+
+def rehydrate(values, schema, step=None, static=True):
+    """Turns values in the order of the columns of the schema back into a dict of dicts in the layout of
+    get_data(). Events and the leading motive are not part of the values. Without static, the elements only
+    contain their name and the values."""
+    data = {} if step is None else {"step": step}
+    elements = {}
+    for category, _ in dynamic_fields:
+        data[category] = {}
+        for properties in schema.get(category, ()):
+            element = dict(properties) if static else {"name": properties["name"]}
+            data[category][properties["name"]] = elements[(category, properties["name"])] = element
+    for (category, name, field), value in zip(schema["columns"], values):
+        element = elements.get((category, name))
+        if element is None:
+            element = data.setdefault(category, {})[name] = elements[(category, name)] = {"name": name}
+        element[field] = float(value)
+    return data
+
+
 def get_data():
-    """Returns a dict of all the above items"""
+    """Returns a dict of all the above items. To record every step, get the schema once and only the values
+    of each step (get_schema, get_values), and rehydrate them when a dict is needed."""
     return {"step": step,
             "needs": get_needs(),
             "consumptions": get_consumptions(),
@@ -116,3 +236,4 @@ def set_goal(event_id):
 
 def drop_goal():
     """Give up on a goal. If you just want to switch for a better goal, use set_goal instead."""
+    events.drop_goal()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+"""
+Autonomous choice of goals.
+
+The Arbiter evaluates the anticipated events as candidate goals. For every candidate, it runs a short rollout of
+the motivation dynamics (needs, modulators and events) from a copy of the current state, in which the agent
+pursues the candidate: an appetitive goal is reached when the event is about to expire, or after the pursuit time
+(by default, half of the rollout) if it does not expire, and an aversive goal is avoided then; a goal is always
+reached within the rollout. A rollout without a goal serves as the baseline, and
+as the outcome of failing at a goal, so the score of a candidate is
+
+    skill * score(rollout with the goal reached) + (1 - skill) * score(baseline)
+
+where the score of a rollout is the mean valence plus the need_weight times the mean weighted satisfaction of the
+needs. Emotions are not computed during rollouts, since they do not feed back into the dynamics.
+
+Rollouts either run in the process, most relevant candidates first, until the time budget of the tick is spent,
+and if not even the baseline is done, the goal stays as it is. Or they run in a pool of worker processes, which
+evaluate all candidates of a choice at once: the rollouts that are not done within the budget keep running, the
+arbiter polls them in every following tick, and no new rollouts are started before the choice is complete. If one
+of the candidates of a running choice is gone (executed, removed or expired), its results describe a state that no
+longer exists, so the choice is discarded.
+Workers reset their agent when they start (api.reset), so its elements must not change afterwards; if a snapshot
+does not fit a worker, or a worker fails otherwise, the arbiter closes the pool and runs the rollouts in the
+process.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import concurrent.futures
+import time
+import warnings
+
+from configuration import Settings
+from model import api, checkpoint, needs, modulators, events, goals
+
+
+def pursuit_steps(horizon, pursuit=None):
+    """The step of a rollout in which a goal that does not expire is reached; pursuit is the time in s,
+    by default half of the rollout. The goal is reached before the last step, so that the rollout sees it."""
+    if pursuit is None:
+        return horizon // 2
+    return max(0, min(horizon - 1, int(round(pursuit * 1000 / Settings.update_milliseconds))))
+
+
+def rollout(event_id=None, horizon=None, pursuit=None, need_weight=1.0, deadline=None):
+    """Runs the motivation dynamics of the current agent for horizon steps, while pursuing the event as a goal
+    (None: without a goal), and returns the score of the trajectory, or None if the deadline (a time of
+    time.perf_counter) passed before. This changes the state of the agent."""
+    horizon = horizon or Settings.arbitration_horizon
+    interval = Settings.update_milliseconds / 1000
+    reached = pursuit_steps(horizon, pursuit)
+    events.set_goal(event_id)
+    need_list = list(needs.needs.values())
+    total_weight = sum(need.weight for need in need_list)
+    valence = modulators.modulators["valence"]
+
+    score = 0.0
+    for i in range(horizon):
+        if deadline is not None and i % 10 == 0 and time.perf_counter() > deadline:
+            return None
+        event = events.events.get(event_id) if event_id is not None else None
+        if event is not None and (i >= reached or 0 < event.expiration <= interval):
+            if event.expected_reward >= 0:
+                events.execute_event(event_id)
+            else:
+                events.remove_event(event_id)  # avoided
+        needs.update()
+        modulators.update()
+        events.update()
+        satisfaction = sum(need.weight * need.value for need in need_list) / total_weight
+        score += valence.value + need_weight * satisfaction
+    return score / horizon
+
+
+def _evaluate(state, event_id, horizon, pursuit, need_weight):
+    """Rollout in a worker process, from a state of checkpoint.get_state()"""
+    checkpoint.set_state(state, notify=False)
+    return rollout(event_id, horizon, pursuit, need_weight)
+
+
+class Arbiter(object):
+    """Chooses the goal of the agent by comparing rollouts of the candidate events. Call update() in every
+    simulation step (see Simulation.arbiter); every interval steps, it sets the best candidate as the goal,
+    if it scores better than the current goal by more than the hysteresis. A choice that is running in the pool
+    is completed in the first step in which its rollouts are done."""
+
+    def __init__(self, horizon=None, budget=None, workers=None, interval=25, pursuit=None, need_weight=1.0,
+                 hysteresis=0.001):
+        self.horizon = horizon or Settings.arbitration_horizon  # number of steps of a rollout
+        self.budget = budget or Settings.arbitration_budget  # time for a choice, in s
+        self.interval = interval  # number of steps between two choices
+        self.pursuit = pursuit  # time to reach a goal that does not expire, in s; None: half of the rollout
+        self.need_weight = need_weight  # weight of the satisfaction of the needs against the valence
+        self.hysteresis = hysteresis
+        workers = Settings.arbitration_workers if workers is None else workers
+        self.pool = None
+        if workers:
+            self.pool = concurrent.futures.ProcessPoolExecutor(workers, initializer=api.reset)
+        self.batch = None  # the rollouts of a choice that are running in the pool, as ({future: id}, skills)
+        self.scores = {}  # scores of the candidates in the last choice, by event id (None: no goal)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        self.discard()
+
+    def discard(self):
+        """Gives up the choice that is running in the pool"""
+        if self.batch is not None:
+            for future in self.batch[0]:
+                future.cancel()
+            self.batch = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def candidates():
+        """The ids of the anticipated events, the most relevant first"""
+        return [event.id for event in sorted(events.events.values(), key=lambda event: -abs(
+            event.expected_reward) * event.certainty * event.consumption.need.weight)]
+
+    def evaluate(self, candidates=None):
+        """Returns the scores of the candidates that could be evaluated within the budget, by event id, and the
+        score of the baseline under None. The state of the agent is not changed."""
+        deadline = time.perf_counter() + self.budget
+        candidates = self.candidates() if candidates is None else list(candidates)
+        skills = {id: events.events[id].skill for id in candidates}
+        if self.pool is not None:
+            try:
+                raw, skills = self._evaluate_in_pool(candidates, skills, deadline)
+            except Exception as error:  # e.g. an agent that the workers do not have, or a broken pool
+                warnings.warn("rollouts in the worker pool failed, running them in the process: %r" % error)
+                self.close()
+            else:
+                return self._score(raw, skills)
+        state = checkpoint.get_state()
+        listeners, goals.listeners = goals.listeners, []  # the goals of the rollouts are not for the outside
+        try:
+            raw = {}
+            for id in [None] + candidates:
+                score = rollout(id, self.horizon, self.pursuit, self.need_weight, deadline)
+                if score is None:
+                    break
+                raw[id] = score
+                checkpoint.set_state(state, notify=False)
+        finally:
+            checkpoint.set_state(state, notify=False)
+            goals.listeners = listeners
+        return self._score(raw, skills)
+
+    @staticmethod
+    def _score(raw, skills):
+        """Weighs the rollouts of the candidates with the baseline; candidates that are gone are left out"""
+        if None not in raw:
+            return {}
+        baseline = raw[None]
+        scores = {None: baseline}
+        for id, score in raw.items():
+            if id is not None and id in events.events:
+                scores[id] = skills[id] * score + (1 - skills[id]) * baseline
+        return scores
+
+    def _evaluate_in_pool(self, candidates, skills, deadline):
+        """Starts the rollouts of a choice in the pool, unless a choice is still running, and waits for them until
+        the deadline. Returns the results and skills of the choice once all of its rollouts are done, or
+        nothing. Exceptions of the workers are raised here."""
+        if self.batch is not None and self.is_stale():
+            self.discard()
+        if self.batch is None:
+            state = checkpoint.get_state()
+            futures = {self.pool.submit(_evaluate, state, id, self.horizon, self.pursuit, self.need_weight): id
+                       for id in [None] + candidates}
+            self.batch = (futures, skills)
+        futures, skills = self.batch
+        done, pending = concurrent.futures.wait(futures, timeout=max(0.0, deadline - time.perf_counter()))
+        if pending:
+            return {}, skills
+        self.batch = None
+        return {futures[future]: future.result() for future in done}, skills
+
+    def is_stale(self):
+        """True if one of the candidates of the choice that is running in the pool is gone"""
+        return any(id is not None and id not in events.events for id in self.batch[0].values())
+
+    def choose(self, candidates=None):
+        """Returns the id of the best goal (None: no goal), and sets it as the goal of the agent"""
+        scores = self.evaluate(candidates)
+        current = goals.goal.id if goals.goal is not None else None
+        if not scores:  # not done within the budget
+            return current
+        self.scores = scores
+        best = max(self.scores, key=self.scores.get)
+        if current not in self.scores or self.scores[best] > self.scores[current] + self.hysteresis:
+            if best != current:
+                api.set_goal(best)
+            return best
+        return current
+
+    def update(self, step):
+        if self.batch is not None and self.is_stale():
+            self.discard()
+        if self.batch is not None or (step % self.interval == 0 and events.events):
+            self.choose()
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+"""
+Snapshots of the state of the agent, as compact binary blobs.
+
+The state of the agent lives in the module registries of the model. A snapshot holds only what changes while the
+agent runs: the dynamic values of all elements (see api.dynamic_fields) in a single array of doubles, the active
+rewards of the consumptions, the inputs that the emotions were last computed from, the anticipated events, the
+goal and the step of the api. The static parameters are not part of it, so a snapshot can only be restored into
+an agent with the same elements; restore() checks this.
+
+Simulation.snapshot() adds the state of the simulation (step, random generator, scheduled triggers, script),
+and Simulation.fork() uses it to run a what-if continuation and return to the state before.
+
+Snapshots are meant to be saved and shared, e.g. as starting points after a burn-in, so they are not pickled:
+loading a pickle can run arbitrary code. A blob holds the length of a JSON header, the header with the events, the
+goal and the sizes of the binary sections, and then the sections: the values, the arrays of the reward queues of
+the consumptions and the inputs of the emotions, followed by the sections of the caller (e.g. the scheduled
+triggers of the simulation). Only the few irregular parts go through JSON, so a snapshot of an agent with hundreds
+of active rewards costs little more than one without.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import array
+import itertools
+import json
+import math
+import operator
+import struct
+import zlib
+
+import numpy as np
+
+from model import api, needs, modulators, events, emotions, goals
+
+FORMAT = 3  # increase if the layout of snapshots changes
+
+_signatures = {}  # names of the elements: checksum
+
+
+def _categories():
+    """The registries of all elements with dynamic values, in the order of api.dynamic_fields"""
+    return (("needs", needs.needs), ("consumptions", needs.consumptions), ("modulators", modulators.modulators),
+            ("aggregates", modulators.aggregates), ("emotions", emotions.emotions))
+
+
+def signature():
+    """A checksum of the names of all elements, to make sure that a snapshot fits the agent"""
+    names = tuple(tuple(registry) for category, registry in _categories())
+    checksum = _signatures.get(names)
+    if checksum is None:
+        text = "\n".join("%s:%s" % (category, name) for category, registry in _categories() for name in registry)
+        checksum = _signatures[names] = zlib.crc32(text.encode("utf-8"))
+    return checksum
+
+
+def _pack_rewards():
+    """The reward queues of all consumptions: the number of queues, then for every queue the index of its
+    consumption, its duration, tick and length (as doubles), then the delays of all queues (int64) and their
+    rewards (doubles)"""
+    layout = [0.0]
+    queues = []
+    for index, consumption in enumerate(needs.consumptions.values()):
+        for duration, queue in consumption.reward_queues.items():
+            layout.extend((index, duration, queue.tick, len(queue.delays)))
+            queues.append(queue)
+    if not queues:
+        return b""
+    layout[0] = len(queues)
+    return b"".join((array.array("d", layout).tobytes(),
+                     np.concatenate([queue.delays for queue in queues]).tobytes(),
+                     np.concatenate([queue.rewards for queue in queues]).tobytes()))
+
+
+def _unpack_rewards(data):
+    consumptions = list(needs.consumptions.values())
+    for consumption in consumptions:
+        consumption.reward_queues = {}
+    if not data:
+        return
+    count, = struct.unpack_from("<d", data)
+    layout = array.array("d", data[8:8 + 32 * int(count)]).tolist()
+    total = int(sum(layout[3::4]))
+    offset = 8 + 32 * int(count)
+    # the queues get disjoint slices of a single copy of the delays and rewards
+    delays = np.frombuffer(data, dtype=np.int64, count=total, offset=offset).copy()
+    rewards = np.frombuffer(data, count=total, offset=offset + 8 * total).copy()
+    position = 0
+    for i in range(0, len(layout), 4):
+        index, duration, tick, length = layout[i:i + 4]
+        end = position + int(length)
+        consumptions[int(index)].reward_queues[duration] = needs.RewardQueue.from_arrays(
+            duration, int(tick), delays[position:end], rewards[position:end])
+        position = end
+
+
+def _pack_inputs():
+    """The inputs that the emotions were last computed from, as doubles; NaN for emotions not computed yet"""
+    values = array.array("d")
+    for emotion in emotions.emotions.values():
+        if emotion.input_values is None:
+            values.extend([math.nan] * len(emotion.inputs))
+        else:
+            values.extend(emotion.input_values)
+    return values.tobytes()
+
+
+def _unpack_inputs(data):
+    values = array.array("d", data).tolist()
+    position = 0
+    for emotion in emotions.emotions.values():
+        count = len(emotion.inputs)
+        inputs = tuple(values[position:position + count])
+        emotion.input_values = None if inputs and math.isnan(inputs[0]) else inputs
+        position += count
+
+
+def get_state():
+    """Returns the state of the agent as a tuple of plain values"""
+    fields = dict(api.dynamic_fields)
+    values = array.array("d")
+    for category, registry in _categories():
+        if len(fields[category]) == 1:
+            values.extend(map(operator.attrgetter(*fields[category]), registry.values()))
+        else:
+            values.extend(itertools.chain.from_iterable(map(operator.attrgetter(*fields[category]),
+                                                            registry.values())))
+    return (FORMAT,
+            signature(),
+            values.tobytes(),
+            _pack_rewards(),
+            _pack_inputs(),
+            [(e.id, e.consumption.name, e.expected_reward, e.certainty, e.skill, e.expiration)
+             for e in events.events.values()],
+            goals.goal.id if goals.goal is not None else None,
+            api.step)
+
+
+def set_state(state, notify=True):
+    """Replaces the state of the agent with a state from get_state(); notify tells the listeners of
+    model.goals about the restored goal"""
+    version, checksum, values, rewards, input_values, event_list, goal_id, step = state
+    if version != FORMAT:
+        raise ValueError("snapshot format %s is not supported" % version)
+    if checksum != signature():
+        raise ValueError("snapshot does not fit the needs, consumptions, modulators and emotions of the agent")
+    fields = dict(api.dynamic_fields)
+    values = iter(array.array("d", values).tolist())
+    for category, registry in _categories():
+        for element in registry.values():
+            for field, value in zip(fields[category], values):  # takes as many values as there are fields
+                setattr(element, field, value)
+    _unpack_rewards(rewards)
+    _unpack_inputs(input_values)
+    events.events.clear()
+    for id, consumption_name, expected_reward, certainty, skill, expiration in event_list:
+        events.events[id] = events.Event(id, needs.consumptions[consumption_name], expected_reward, certainty,
+                                         skill, expiration)
+    goals.set_goal(events.events[goal_id] if goal_id is not None else None, notify)
+    api.step = step
+
+
+def to_bytes(state, data=None, sections=()):
+    """Returns a state from get_state() as bytes, together with further data that JSON can hold, and further
+    binary sections"""
+    version, checksum, values, rewards, input_values, event_list, goal_id, step = state
+    sections = (values, rewards, input_values) + tuple(sections)
+    header = json.dumps([version, checksum, [len(section) for section in sections], event_list, goal_id, step, data])
+    header = header.encode("utf-8")
+    return b"".join((struct.pack("<I", len(header)), header) + sections)
+
+
+def from_bytes(blob):
+    """Returns the state, the further data and the further sections of a blob from to_bytes()"""
+    try:
+        length, = struct.unpack_from("<I", blob)
+        header = json.loads(bytes(blob[4:4 + length]).decode("utf-8"))
+        version, checksum, sizes, event_list, goal_id, step, data = header
+        position = 4 + length
+        if len(sizes) < 3 or position + sum(sizes) != len(blob):
+            raise ValueError("wrong size of the sections")
+    except (struct.error, ValueError, TypeError):
+        raise ValueError("not a snapshot of format %s" % FORMAT)
+    sections = []
+    for size in sizes:
+        sections.append(bytes(blob[position:position + size]))
+        position += size
+    values, rewards, input_values = sections[:3]
+    return (version, checksum, values, rewards, input_values, event_list, goal_id, step), data, sections[3:]
+
+
+def snapshot():
+    """Returns the state of the agent as bytes"""
+    return to_bytes(get_state())
+
+
+def restore(blob, notify=True):
+    """Returns the agent to the state of a snapshot"""
+    state, _, _ = from_bytes(blob)
+    set_state(state, notify)
@@ -7,7 +7,11 @@ Helper functions
 __author__ = 'joscha'
 __date__ = '31.03.16'
 
+import functools
 import math
+
+import numpy as np
+
 from configuration import Settings
 
 
@@ -19,12 +23,18 @@ def clip(value, min_value=0.0, max_value=1.0):
 def decay(previous_value, decay_time=-1):
     """Perform an approximate logistic decay from 1 to 0 within time 'decay':
     we assume the sigmoidal function y = 1-1/(1+e^-12(x-1/2))"""
+    return decay_n(previous_value, decay_time, 1)
+
+
+def decay_n(previous_value, decay_time=-1, steps=1):
+    """Perform the logistic decay for a number of simulation steps at once. Every step moves us by the same
+    interval along the curve, so this is the same as calling decay() 'steps' times."""
 
     if decay_time < 0: return previous_value  # value does not decay
 
     interval = Settings.update_milliseconds / 1000
 
-    x = get_inverted_decay_value(previous_value) + interval/decay_time  # find out where we have been in the curve
+    x = get_inverted_decay_value(previous_value) + steps * interval/decay_time  # where we are in the curve
     if x >= 1: return 0
     return 1 - 1 / (1 + math.exp(-12 * (x - 0.5)))
 
@@ -45,11 +55,13 @@ def exponential_scaling(x, factor=6):
 def marginal_sum(values, maximum = 1.0):
     """Returns the marginal utility of a list of values, depending on the maximum utility. The utility of the first
     value is its value, the utility of the next one is a fraction of the remaining utility.
-    Here, we use it to compute the sum of pain signals etc."""
-    s = 0
+    Here, we use it to compute the sum of pain signals etc.
+    Every value reduces the remaining utility by the factor (1 - v/maximum), so the sum is
+    maximum * (1 - product of these factors), which does not depend on the order of the values."""
+    remaining = 1.0
     for v in values:
-        s += (maximum - s)/maximum * v
-    return s
+        remaining *= 1 - v / maximum
+    return maximum * (1 - remaining)
 
 
 def calculate_signal_strength(step, total_amount = 1.0, duration = 3.5):
@@ -68,3 +80,42 @@ def calculate_signal_strength(step, total_amount = 1.0, duration = 3.5):
     # amount is the integral from t1 to t2, i.e. beginning and end of the current timestep of the simulation
     amount = math.exp(-t1*t1/2) - math.exp(-t2*t2/2)
     return amount * total_amount / duration * 3.5
+
+
+max_kernel_length = 10000  # longer kernels are not stored, their signal strengths are computed when needed
+
+
+def get_signal_length(duration):
+    """Returns the number of steps of a consumption with the given duration. A consumption stays active as long as
+    step * interval < duration, so it ends with the first step beyond the duration."""
+    interval = Settings.update_milliseconds / 1000
+    last_step = max(0, int(math.ceil(duration / interval)))
+    while last_step * interval < duration:  # correct rounding errors of the division
+        last_step += 1
+    while last_step > 0 and (last_step - 1) * interval >= duration:
+        last_step -= 1
+    return last_step + 1
+
+
+def signal_strengths(steps, duration):
+    """Returns the signal strengths of a unit reward for an array of steps, see calculate_signal_strength"""
+    step_length = Settings.update_milliseconds / 1000 * 3.5 / duration
+    t1 = steps * step_length
+    t2 = (steps + 1) * step_length
+    return (np.exp(-t1 * t1 / 2) - np.exp(-t2 * t2 / 2)) / duration * 3.5
+
+
+@functools.lru_cache(maxsize=64)
+def _build_signal_kernel(duration, update_milliseconds):
+    length = get_signal_length(duration)
+    if length > max_kernel_length:
+        return None, length
+    return signal_strengths(np.arange(length), duration), length
+
+
+def get_signal_kernel(duration):
+    """Returns the signal strengths of a unit reward for all timesteps of a consumption with the given duration, as
+    an array, together with the number of steps of the consumption. The kernels only depend on the duration and the
+    length of a timestep, so we keep the most recently used ones. Kernels longer than max_kernel_length are not
+    built; the kernel is None then, and the strengths have to be computed with signal_strengths."""
+    return _build_signal_kernel(duration, Settings.update_milliseconds)
@@ -8,56 +8,154 @@ __author__ = 'joscha'
 __date__   = '31.03.16'
 
 
+import operator
+
 from model.modulators import modulators, aggregates
 from model.needs import needs
 from model.events import events, estimate_future_appetence, estimate_future_aversion
 
 emotions = {}
 
-class Emotion(object):
-    """An emotion is an emergent configuration of the cognitive system of an agent"""
+# inputs of the emotions are (category, element) or (category, element, field), e.g. ("needs", "exploration", "pain")
+registries = {"modulators": modulators, "aggregates": aggregates, "needs": needs}
+anticipations = {"appetence": estimate_future_appetence, "aversion": estimate_future_aversion}
 
-    def __init__(self, name, fn):
-        self.name = name
-        self.value = 0
-        self.calculate = fn
-        emotions[name] = self
+# if set, an emotion is only recomputed if one of its inputs changed by more than epsilon, e.g. 1e-6; the values
+# of the emotions may then lag behind their inputs by that much. None recomputes every observed emotion exactly.
+epsilon = None
+observed = None  # names of the emotions that are computed in every update; None: all of them
 
-    def update(self):
-        self.value = self.calculate()
 
+readers = {}  # input: function that returns its current value
+plan = None  # the readers of the inputs of the observed emotions, and how each emotion picks its inputs
 
 
-Emotion("joy", lambda: max(0, modulators["valence"].value) * modulators["arousal"].value)
-Emotion("bliss", lambda: max(0, modulators["valence"].value) * modulators["resolution_level"].value)
-Emotion("sadness", lambda: max(0, -modulators["valence"].value * (1-modulators["arousal"].value)))
-Emotion("anger", lambda: max(0, -modulators["valence"].value) * modulators["arousal"].value)
-Emotion("fear", lambda: min(1, -estimate_future_aversion()))
-Emotion("hope", lambda: min(1, estimate_future_appetence()))
+def get_reader(source):
+    """Returns a function that reads an input, e.g. ("modulators", "valence") or ("events", "aversion")"""
+    if source not in readers:
+        category, name = source[0], source[1]
+        if category == "events":
+            readers[source] = anticipations[name]
+        else:
+            registry, field = registries[category], source[2] if len(source) > 2 else "value"
+            readers[source] = lambda: getattr(registry[name], field)
+    return readers[source]
 
-Emotion("anxiety", lambda: (1-aggregates["general_competence"].value) * (1-needs["exploration"].value))
-Emotion("surprise", lambda: min(1, 10 * needs["exploration"].pain) * modulators["arousal"].value)
-Emotion("curiosity", lambda: (1 - needs["exploration"].value) * aggregates["general_competence"].value)
 
-Emotion("pride", lambda: max(0, 1-(2*needs["legitimacy"].value)))
-Emotion("shame", lambda: max(0, 1 - (2 * needs["legitimacy"].value)))
-Emotion("disgust", lambda: min(1, 10 * needs["aesthetics"].pain))
+def get_input(source):
+    """Returns the current value of an input"""
+    return get_reader(source)()
 
-Emotion("shyness", lambda: (1-needs["dominance"].value)*(1-needs["affiliation"].value)*(1-needs["competence"].value))
 
-def testing():
-    return max(0, modulators["valence"].value) * modulators["resolution_level"].value
+def invalidate_plan():
+    """Call this when emotions are added or replaced, e.g. when the registry is swapped for another agent"""
+    global plan
+    plan = None
 
-emotions["joy"].update= testing
+
+class Emotion(object):
+    """An emotion is an emergent configuration of the cognitive system of an agent.
+    Its value is a function of its inputs, which are passed to fn in the order in which they are given."""
+
+    def __init__(self, name, fn, inputs=()):
+        self.name = name
+        self.value = 0
+        self.calculate = fn
+        self.inputs = tuple(inputs)
+        self.input_values = None  # values of the inputs at the last calculation
+        emotions[name] = self
+        invalidate_plan()
+
+    def update(self, values=None):
+        """Recompute the emotion; if epsilon is set, only if its inputs changed by more than epsilon since the
+        last time. values may contain the current values of the inputs."""
+        if values is None:
+            values = tuple(get_input(source) for source in self.inputs)
+        last = self.input_values
+        if epsilon is not None and last is not None and (values == last or
+                                                         all(abs(v - w) <= epsilon for v, w in zip(values, last))):
+            return
+        self.value = self.calculate(*values)
+        self.input_values = values
+
+
+valence = ("modulators", "valence")
+arousal = ("modulators", "arousal")
+
+Emotion("joy", lambda v, a: max(0, v) * a, (valence, arousal))
+Emotion("bliss", lambda v, r: max(0, v) * r, (valence, ("modulators", "resolution_level")))
+Emotion("sadness", lambda v, a: max(0, -v * (1 - a)), (valence, arousal))
+Emotion("anger", lambda v, a: max(0, -v) * a, (valence, arousal))
+Emotion("fear", lambda aversion: min(1, -aversion), (("events", "aversion"),))
+Emotion("hope", lambda appetence: min(1, appetence), (("events", "appetence"),))
+
+Emotion("anxiety", lambda c, e: (1 - c) * (1 - e), (("aggregates", "general_competence"), ("needs", "exploration")))
+Emotion("surprise", lambda p, a: min(1, 10 * p) * a, (("needs", "exploration", "pain"), arousal))
+Emotion("curiosity", lambda e, c: (1 - e) * c, (("needs", "exploration"), ("aggregates", "general_competence")))
+
+Emotion("pride", lambda l: max(0, 1 - (2 * l)), (("needs", "legitimacy"),))
+Emotion("shame", lambda l: max(0, 1 - (2 * l)), (("needs", "legitimacy"),))
+Emotion("disgust", lambda p: min(1, 10 * p), (("needs", "aesthetics", "pain"),))
+
+Emotion("shyness", lambda d, a, c: (1 - d) * (1 - a) * (1 - c),
+        (("needs", "dominance"), ("needs", "affiliation"), ("needs", "competence")))
+
+
+def observe(names=None):
+    """Only compute the given emotions from now on; the others keep their last value. None observes all emotions."""
+    global observed
+    if names is not None:
+        names = set(names)
+        for name in names:
+            if name not in emotions:
+                raise KeyError("unknown emotion: %s" % name)
+    observed = names
+    invalidate_plan()
+
+
+def get_plan():
+    """Returns the readers of all inputs of the observed emotions, each input only once, and a list of
+    (emotion, function that picks the tuple of its inputs from the values of the readers)"""
+    global plan
+    if plan is None:
+        sources = []
+        positions = {}
+        entries = []
+        for emotion in emotions.values():
+            if is_observed(emotion.name):
+                for source in emotion.inputs:
+                    if source not in positions:
+                        positions[source] = len(sources)
+                        sources.append(source)
+                picked = [positions[source] for source in emotion.inputs]
+                if len(picked) == 1:
+                    entries.append((emotion, lambda values, i=picked[0]: (values[i],)))
+                else:
+                    entries.append((emotion, operator.itemgetter(*picked)))
+        plan = [get_reader(source) for source in sources], entries
+    return plan
+
+
+def is_observed(name):
+    return observed is None or name in observed
 
 
 def reset():
-    pass
+    for emotion in emotions.values():
+        emotion.input_values = None
 
 
 def update():
-    for emotion in emotions.values():
-        emotion.update()
+    input_readers, entries = get_plan()
+    values = [read() for read in input_readers]  # every input is read only once
+    if epsilon is None:
+        for emotion, pick in entries:
+            inputs = pick(values)
+            emotion.value = emotion.calculate(*inputs)
+            emotion.input_values = inputs
+    else:
+        for emotion, pick in entries:
+            emotion.update(pick(values))
 
 
 def get_emotions():
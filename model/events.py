@@ -8,10 +8,10 @@ __author__ = 'joscha'
 __date__ = '4/4/16'
 
 import model.needs as needs
+import model.modulators as modulators
+from model import goals
 from configuration import Settings
 
-goal = None
-
 
 class Event(object):
     """Events are anticipated situations in the inner or perceptual world of the agent. They become
@@ -39,31 +39,99 @@ class Event(object):
                 self.expiration = 0  # you have to drop expired events explicitly
 
     def is_goal(self):
-        return self is goal
-
+        return self is goals.goal
+
+
+class EventStore(dict):
+    """The anticipated events by id. Besides the dict, the store keeps the ids ordered by expiration, and caches
+    the sums of anticipated rewards for hope and fear.
+    Expirations of all events decrease by the same amount in every tick, so the order only has to be rebuilt
+    when events are added, removed or changed. The discounted rewards change in every tick, so the sums
+    are computed in a single pass when they are first needed after a change."""
+
+    def __init__(self, *args, **kwargs):
+        super(EventStore, self).__init__()
+        self._order = None  # event ids, sorted by expiration; None if it has to be rebuilt
+        self._sums = None  # (focus, appetence, aversion) at the time of the last estimate
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, id, event):
+        super(EventStore, self).__setitem__(id, event)
+        self.changed()
+
+    def __delitem__(self, id):
+        super(EventStore, self).__delitem__(id)
+        self.changed()
+
+    def update(self, *args, **kwargs):
+        for id, event in dict(*args, **kwargs).items():
+            self[id] = event
+
+    def pop(self, id, *default):
+        if id not in self:
+            if default:
+                return default[0]
+            raise KeyError(id)
+        event = self[id]
+        del self[id]
+        return event
+
+    def popitem(self):
+        id = next(reversed(self))
+        return id, self.pop(id)
+
+    def setdefault(self, id, event=None):
+        if id not in self:
+            self[id] = event
+        return self[id]
+
+    def clear(self):
+        super(EventStore, self).clear()
+        self.changed()
+
+    def changed(self, order=True):
+        """Call this when the reward, certainty or expiration of an event or the goal changes. If the order of the
+        expirations cannot have changed, pass order=False."""
+        if order:
+            self._order = None
+        self._sums = None
+
+    def ordered(self):
+        """Returns the events, sorted by expiration"""
+        if self._order is None:
+            self._order = sorted(self, key=lambda id: self[id].expiration)
+        return [self[id] for id in self._order]
+
+    def anticipation_sums(self):
+        """Returns the sums of the discounted rewards of appetitive and aversive events; the goal is amplified by
+        the focus modulator"""
+        focus = modulators.modulators["focus"].value
+        if self._sums is None or self._sums[0] != focus:
+            appetence = aversion = 0
+            for e in self.values():
+                if e.expiration != 0 and e.expected_reward != 0:
+                    anticipated_reward = e.consumption.get_anticipated_reward(e.expected_reward, e.expiration)
+                    if e.is_goal():
+                        anticipated_reward *= 1 + focus
+                    if e.expected_reward > 0:
+                        appetence += anticipated_reward
+                    else:
+                        aversion += anticipated_reward
+            self._sums = (focus, appetence, aversion)
+        return self._sums[1:]
+
+
+events = EventStore()
 
-events = {}
 
 def estimate_future_appetence():
     """Hope"""
-    import model.modulators as modulators
-    s = 0
-    for e in events.values():
-        if e.expected_reward>0 and e.expiration != 0:
-            anticipated_reward = e.consumption.get_anticipated_reward(e.expected_reward, e.expiration)
-            s+= anticipated_reward *(1+modulators.modulators["focus"].value) if e.is_goal() else anticipated_reward
-    return s
+    return events.anticipation_sums()[0]
 
 
 def estimate_future_aversion():
     """Fear"""
-    import model.modulators as modulators
-    s = 0
-    for e in events.values():
-        if e.expected_reward < 0 and e.expiration != 0:
-            anticipated_reward = e.consumption.get_anticipated_reward(e.expected_reward, e.expiration)
-            s += anticipated_reward * (1+modulators.modulators["focus"].value) if e.is_goal() else anticipated_reward
-    return s
+    return events.anticipation_sums()[1]
 
 
 def create_event(id, consumption_name, expected_reward=0, certainty=1, skill=0.8, expiration=-1):
@@ -94,6 +162,7 @@ def change_event(id, expected_reward=None, certainty=None, skill=None, expiratio
     event.skill += skill_delta
     if expiration is not None:
         event.expiration = expiration
+    events.changed()
 
     relevance = abs(event.consumption.get_anticipated_reward(event.expected_reward, event.expiration) *
                     event.consumption.need.weight)
@@ -108,7 +177,7 @@ def change_event(id, expected_reward=None, certainty=None, skill=None, expiratio
         needs.consumptions["disconfirmation"].trigger(- certainty_delta * relevance)
 
     if event.is_goal():
-        needs.consumptions["failure"].trigger(-relevance * goal.skill * goal.certainty)
+        needs.consumptions["failure"].trigger(-relevance * event.skill * event.certainty)
 
         # react to changes in expected competence
         if skill_delta > 0:  # increase in epistemic competence
@@ -125,6 +194,8 @@ def drop_event(id):
 
 def remove_event(id):
     """Delete the event from our expectations, without any other consequences"""
+    if events[id] is goals.goal:
+        set_goal(None)
     del events[id]
 
 
@@ -133,7 +204,6 @@ def execute_event(id, reward=None):
     The reward reflects the actual reward generated by the world. If the parameter is omitted,
     we assume the reward to be exactly as expected."""
     event = events[id]
-    global goal
     if reward is None: reward = event.expected_reward
     event.consumption.trigger(reward)
 
@@ -153,7 +223,7 @@ def execute_event(id, reward=None):
         if event.is_goal():
             needs.consumptions["success"].trigger((1 - event.skill) * relevance)  # I succeeded at my skillz
 
-    if event is goal: set_goal(None)
+    if event.is_goal(): set_goal(None)
     remove_event(id)
 
 
@@ -171,34 +241,34 @@ def consume(consumption_name, reward=None):
 
 
 def get_events():
-    """Returns a sorted list with anticipated events"""
-    event_list = [{"id": e.id,
-                   "time": e.expiration,
-                   "type": "aversive" if e.expected_reward < 0 else "appetitive",
-                   "action": e.consumption.name,
-                   "need": e.consumption.need.name,
-                   "reward": e.expected_reward,
-                   "discounted_reward": e.consumption.get_anticipated_reward(e.expected_reward, e.expiration),
-                   "certainty": e.certainty,
-                   "competence": e.skill,
-                   "is_goal": goal == e
-                   } for e in events.values()]
-    return sorted(event_list, key=lambda k: k['time'])
+    """Returns a list with anticipated events, sorted by expiration"""
+    return [{"id": e.id,
+             "time": e.expiration,
+             "type": "aversive" if e.expected_reward < 0 else "appetitive",
+             "action": e.consumption.name,
+             "need": e.consumption.need.name,
+             "reward": e.expected_reward,
+             "discounted_reward": e.consumption.get_anticipated_reward(e.expected_reward, e.expiration),
+             "certainty": e.certainty,
+             "competence": e.skill,
+             "is_goal": e.is_goal()
+             } for e in events.ordered()]
 
 
 def set_goal(event_id=None):
     """Set the current goal. There can be only one."""
-    global goal
+    events.changed(order=False)
     if event_id is None:
-        goal = None
+        goals.set_goal(None)
     else:
-        goal = events[event_id]
+        goals.set_goal(events[event_id])
 
 
 def drop_goal():
     """Give up on a goal because we cannot get it. If we found something better, use set_goal."""
     # If the goal was relevant, we will be disappointed.
-    drop_event(goal)
+    if goals.goal is not None:
+        drop_event(goals.goal.id)
 
 
 def reset():
@@ -207,7 +277,11 @@ def reset():
 
 
 def update():
+    expired = []
     for key, event in events.items():
         event.update()
-        if event.expiration == 0:  # remove expired events
-            del events[key]
+        if event.expiration == 0:
+            expired.append(key)
+    events.changed(order=False)  # all expirations decreased by the same amount
+    for key in expired:  # remove expired events
+        remove_event(key)
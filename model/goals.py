@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+"""
+The current goal of the agent, and the need it is directed at (the leading motive).
+
+Needs, modulators and events read the goal in every tick, so we keep it in this module, which can be imported
+everywhere without circular imports. Change the goal only with set_goal(); it updates the leading motive and
+notifies the listeners.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+goal = None  # the current goal, an events.Event
+leading_need = None  # the need that is the object of the goal
+
+listeners = []  # functions that are called with the new goal (or None) whenever the goal changes
+
+
+def set_goal(event, notify=True):
+    """Make the event the current goal; None removes the goal"""
+    global goal, leading_need
+    goal = event
+    leading_need = event.consumption.need if event is not None else None
+    if notify:
+        for listener in listeners:
+            listener(event)
+
+
+def add_listener(listener):
+    """Call listener(goal) whenever the goal changes"""
+    listeners.append(listener)
+
+
+def remove_listener(listener):
+    listeners.remove(listener)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+Optional measurements of api.update(): the time spent in every stage, the number of active rewards per
+consumption, the number of anticipated events, and the change in the number of memory blocks allocated by
+the interpreter (sys.getallocatedblocks). Enable it with api.enable_instrumentation(); when it is off,
+api.update() only pays for a single check.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import sys
+import time
+
+
+class StageStatistics(object):
+    """Accumulated measurements of a stage of the update"""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0  # total
+        self.last_seconds = 0.0
+        self.max_seconds = 0.0
+        self.allocated_blocks = 0  # net change of the allocated memory blocks, total
+        self.last_allocated_blocks = 0
+
+    def add(self, seconds, allocated_blocks):
+        self.calls += 1
+        self.seconds += seconds
+        self.last_seconds = seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.allocated_blocks += allocated_blocks
+        self.last_allocated_blocks = allocated_blocks
+
+    def get_data(self):
+        return {"calls": self.calls,
+                "seconds": self.seconds,
+                "mean_seconds": self.seconds / self.calls if self.calls else 0.0,
+                "last_seconds": self.last_seconds,
+                "max_seconds": self.max_seconds,
+                "allocated_blocks": self.allocated_blocks,
+                "last_allocated_blocks": self.last_allocated_blocks}
+
+
+class Instrumentation(object):
+    """Runs the stages of an update and records their statistics"""
+
+    def __init__(self):
+        self.stages = {}  # name: StageStatistics
+        self.active_rewards = {}  # consumption name: number of active rewards after the last update
+        self.events = 0  # number of anticipated events after the last update
+
+    def run(self, stages):
+        """Calls the functions of the stages, given as (name, function), and measures them"""
+        clock = time.perf_counter
+        blocks = sys.getallocatedblocks
+        for name, function in stages:
+            statistics = self.stages.get(name)
+            if statistics is None:
+                statistics = self.stages[name] = StageStatistics()
+            allocated = blocks()
+            start = clock()
+            function()
+            seconds = clock() - start
+            statistics.add(seconds, blocks() - allocated)
+
+    def count(self, consumptions, events):
+        self.active_rewards = {c.name: c.count_rewards() for c in consumptions}
+        self.events = len(events)
+
+    def get_data(self):
+        stages = {name: statistics.get_data() for name, statistics in self.stages.items()}
+        return {"stages": stages,
+                "seconds": sum(statistics["seconds"] for statistics in stages.values()),
+                "last_seconds": sum(statistics["last_seconds"] for statistics in stages.values()),
+                "active_rewards": dict(self.active_rewards),
+                "events": self.events}
+
+    def describe(self):
+        """A short line with the time of the stages in the last update, e.g. for a status bar"""
+        return ", ".join("%s %.2f ms" % (name, statistics.last_seconds * 1000)
+                         for name, statistics in self.stages.items()) + \
+            ", %d rewards, %d events" % (sum(self.active_rewards.values()), self.events)
@@ -7,9 +7,9 @@ Modulators
 __author__ = 'joscha'
 __date__ = '31.03.16'
 
-from model.common import decay, marginal_sum
+from model.common import decay_n
 from model.needs import needs  # import needs, competence, exploration, consumptions
-from model.events import goal
+from model import goals
 
 
 modulators = {}
@@ -33,16 +33,17 @@ class Modulator(object):
 
         modulators[name] = self
 
-    def update(self):
-        """Perform updates of the value of the modulator, based on the time."""
+    def update(self, steps=1):
+        """Perform updates of the value of the modulator, based on the time.
+        With more than one step, the modulator decays towards the baseline over all of them at once."""
 
         # map interval to (1..0)
         if self.value >= self.baseline:
             value = (self.value - self.baseline) / (self.max - self.baseline)
-            self.value = decay(value, self.decay) * (self.max - self.baseline) + self.baseline
+            self.value = decay_n(value, self.decay, steps) * (self.max - self.baseline) + self.baseline
         else:
             value = (self.baseline - self.value) / (self.baseline - self.min)
-            self.value = self.baseline - decay(value, self.decay) * (self.baseline - self.min)
+            self.value = self.baseline - decay_n(value, self.decay, steps) * (self.baseline - self.min)
 
     def get_normalized_value(self):
         """Scales the modulator from -1 = min over 0 = baseline to +1 = max"""
@@ -82,38 +83,58 @@ Aggregate("general_competence")
 Aggregate("epistemic_competence")
 
 
-def adjusted_sum_of_need_properties(property, normalized = False):
-    """Uses a marginal sum to add properties of all needs to approach their maximum value.
-    Gives a bonus to the currently leading motive, according to the focus modulator.
-    If normalized, the result is scaled against a maximum of 1."""
-    values = [getattr(need, property) * ((1 + modulators["focus"].value) if need.is_leading_motive() else 1)
-              for need in needs.values()]
-    maximum = max([need.weight * ((1 + modulators["focus"].value) if need.is_leading_motive() else 1)
-                   for need in needs.values()])
-    return marginal_sum(values, maximum) if not normalized else marginal_sum(values, maximum)/maximum
+def aggregate_need_properties():
+    """Uses marginal sums to add the pain, pleasure, urge and urgency of all needs to approach their maximum value,
+    and returns them together with their common maximum. The currently leading motive gets a bonus, according to
+    the focus modulator. Every need is read only once."""
+    leading_need = goals.leading_need
+    focus_bonus = 1 + modulators["focus"].value
+
+    maximum = 0
+    properties = []
+    for need in needs.values():
+        if need is leading_need:
+            properties.append((need.pain * focus_bonus, need.pleasure * focus_bonus,
+                               need.urge * focus_bonus, need.urgency * focus_bonus))
+            maximum = max(maximum, need.weight * focus_bonus)
+        else:
+            properties.append((need.pain, need.pleasure, need.urge, need.urgency))
+            maximum = max(maximum, need.weight)
+
+    # marginal sums, see common.marginal_sum
+    pain = pleasure = urge = urgency = 1.0
+    for need_pain, need_pleasure, need_urge, need_urgency in properties:
+        pain *= 1 - need_pain / maximum
+        pleasure *= 1 - need_pleasure / maximum
+        urge *= 1 - need_urge / maximum
+        urgency *= 1 - need_urgency / maximum
+    return (maximum * (1 - pain), maximum * (1 - pleasure), maximum * (1 - urge), maximum * (1 - urgency),
+            maximum)
 
 
 def update():
     """Call this function in every timestep to update the modulator influences."""
+    goal = goals.goal
 
     for modulator in modulators.values():
         modulator.update()
 
+    pain, pleasure, urge, urgency, maximum = aggregate_need_properties()
+
     # global pain perception (nociception) roughly aligns with 'substance p'
-    aggregates["combined_pain"].value = adjusted_sum_of_need_properties("pain")
+    aggregates["combined_pain"].value = pain
 
     # global pleasure perception (~endorphin, but it is more complicated)
-    aggregates["combined_pleasure"].value = adjusted_sum_of_need_properties("pleasure")
+    aggregates["combined_pleasure"].value = pleasure
 
     # valence combines pleasure and pain
-    modulators["valence"].approach(adjusted_sum_of_need_properties("pleasure", True) -
-                                   adjusted_sum_of_need_properties("pain", True))
+    modulators["valence"].approach(pleasure / maximum - pain / maximum)
 
     # combined urge tells us how much we should do stuff (~ dopamine)
-    aggregates["combined_urge"].value = adjusted_sum_of_need_properties("urge", normalized = True)
+    aggregates["combined_urge"].value = urge / maximum
 
     # combined urgency is the stress level (~ cortisol)
-    aggregates["combined_urgency"].value = adjusted_sum_of_need_properties("urgency", normalized = True)
+    aggregates["combined_urgency"].value = urgency / maximum
 
     # arousal depends on the urges and urgencies of all needs (~ noradrenaline)
 
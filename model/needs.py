@@ -3,13 +3,15 @@
 """
 The needs of our agent
 """
-from configuration import Settings
 
 __author__ = 'joscha'
 __date__ = '31.03.16'
 
-from model.common import decay, get_inverted_decay_value, clip, calculate_signal_strength
-from model import defaults
+import numpy as np
+
+from model.common import decay_n, get_inverted_decay_value, clip, calculate_signal_strength, get_signal_kernel, \
+    signal_strengths
+from model import defaults, goals
 
 
 class Need(object):
@@ -57,11 +59,13 @@ class Need(object):
 
         needs[name] = self
 
-    def update(self):
-        """Perform updates of all dynamic values of the drive"""
-        self.value = decay(self.value, self.decay)
-        self.pleasure = decay(self.pleasure / self.weight, self.pleasure_decay) * self.weight
-        self.pain = decay(self.pain / self.weight, self.pain_decay) * self.weight
+    def update(self, steps=1):
+        """Perform updates of all dynamic values of the drive. With more than one step, the need decays over all
+        of them at once; this is exact as long as no consumption acts on the need in the meantime, because
+        decayed pain never grows while the pain from depletion only grows as the value sinks."""
+        self.value = decay_n(self.value, self.decay, steps)
+        self.pleasure = decay_n(self.pleasure / self.weight, self.pleasure_decay, steps) * self.weight
+        self.pain = decay_n(self.pain / self.weight, self.pain_decay, steps) * self.weight
         self._compute_urge_strength()
         self._compute_urgency()
         self._compute_pain_from_depletion()
@@ -83,6 +87,7 @@ class Need(object):
         pain = clip(1 - 20 * self.value) ** 2 * self.weight  # pain starts at 90% depletion
         self.pain = max(self.pain, pain)
 
+
     def satisfy(self, delta):
         """increase satisfaction of a need by the given value,
         trigger pleasure signal proportional to weight."""
@@ -122,16 +127,71 @@ class Need(object):
 
     def is_leading_motive(self):
         """Returns True if the need is object of the current goal"""
-        from model.events import goal
-        if goal is None:
-            return False
-        else:
-            return goal.consumption.need is self
+        return goals.leading_need is self
 
 
 needs = {}
 
 
+class RewardQueue(object):
+    """The active rewards of a consumption that share a duration, oldest first. tick is the step of the oldest
+    reward, and delays holds for every reward the number of steps after the oldest one in which it was triggered,
+    so a reward is at step tick - delay of the signal kernel. Advancing all rewards only means counting the tick,
+    and the signals of all rewards are gathered from the reversed kernel, kernel[tick::-1][delays]."""
+
+    def __init__(self, duration, steps, rewards):
+        self.duration = duration
+        order = sorted(range(len(steps)), key=lambda i: -steps[i])  # oldest first
+        self.tick = steps[order[0]]
+        self.delays = np.array([self.tick - steps[i] for i in order], dtype=np.int64)
+        self.rewards = np.array([rewards[i] for i in order], dtype=float)
+
+    @classmethod
+    def from_arrays(cls, duration, tick, delays, rewards):
+        """Returns a queue that uses the given arrays of delays (int64, oldest first, starting with 0) and rewards
+        (float) without copying them, e.g. when a snapshot is restored"""
+        queue = cls.__new__(cls)
+        queue.duration = duration
+        queue.tick = tick
+        queue.delays = delays
+        queue.rewards = rewards
+        return queue
+
+    def __len__(self):
+        return len(self.delays)
+
+    def steps(self):
+        return (self.tick - self.delays).tolist()
+
+    def add(self, reward):
+        """Add a reward at step 0"""
+        self.delays = np.append(self.delays, self.tick)
+        self.rewards = np.append(self.rewards, reward)
+
+    def advance(self):
+        """Returns the sum of the signals of the rewards in the current step, and moves them to the next one;
+        expired rewards are removed"""
+        kernel, length = get_signal_kernel(self.duration)
+        if len(self.delays) == 1:  # a single reward is the oldest one
+            signal = kernel[self.tick] if kernel is not None else calculate_signal_strength(self.tick, 1.0,
+                                                                                            self.duration)
+            value = float(signal) * self.rewards.item(0)
+        elif kernel is not None:
+            value = float(np.dot(kernel[self.tick::-1][self.delays], self.rewards))
+        else:
+            value = float(np.dot(signal_strengths(self.tick - self.delays, self.duration), self.rewards))
+        self.tick += 1
+        if self.tick >= length:  # the oldest reward has expired
+            active = self.delays > self.tick - length
+            self.delays = self.delays[active]
+            self.rewards = self.rewards[active]
+            if len(self.delays):
+                oldest = int(self.delays[0])
+                self.delays -= oldest
+                self.tick -= oldest
+        return value
+
+
 class Consumption(object):
     """Create a consumption to satisfy or frustrate a need.
     You can change the actual reward and duration later when triggering the event"""
@@ -146,10 +206,30 @@ class Consumption(object):
         self.default_duration = duration  # duration over which the reward is typically experienced
         self.max_reward = max_reward  # limit of cumulated reward that can be received per timestep
         self.anticipation_discount_factor = anticipation_discount_factor  # how much do I believe in the future?
-        self.active_rewards = []  # list of currently active events of this category
+        self.reward_queues = {}  # currently active events of this category, as a RewardQueue per duration
 
         consumptions[name] = self
 
+    @property
+    def active_rewards(self):
+        """The currently active rewards as a list of (step, reward, duration)"""
+        return [(step, reward, duration) for duration, queue in self.reward_queues.items()
+                for step, reward in zip(queue.steps(), queue.rewards.tolist())]
+
+    @active_rewards.setter
+    def active_rewards(self, active_rewards):
+        groups = {}
+        for step, reward, duration in active_rewards:
+            group = groups.setdefault(duration, ([], []))
+            group[0].append(step)
+            group[1].append(reward)
+        self.reward_queues = {duration: RewardQueue(duration, steps, rewards)
+                              for duration, (steps, rewards) in groups.items()}
+
+    def count_rewards(self):
+        """Returns the number of active rewards"""
+        return sum(len(queue) for queue in self.reward_queues.values())
+
     def trigger(self, reward=None, duration=-1):
         """Set a reward value and a duration in s for the consumption.
         We could do this directly, but I want to show it in the visualization.
@@ -158,7 +238,11 @@ class Consumption(object):
             reward = self.default_reward
         if duration == -1:
             duration = self.default_duration
-        self.active_rewards.append((0, reward, duration))
+        queue = self.reward_queues.get(duration)
+        if queue is None:
+            self.reward_queues[duration] = RewardQueue(duration, (0,), (reward,))
+        else:
+            queue.add(reward)
 
     def get_anticipated_reward(self, reward, expiration):
         """Returns a discounted reward value, based on the interval until the consumption expires"""
@@ -180,16 +264,16 @@ class Consumption(object):
             self.need.imagine_frustrate(certainty * (1.0 - skill) * discounted_reward)  # aversion
 
     def update(self):
-        """Make sure we call this every cycle and turn it off again"""
+        """Make sure we call this every cycle and turn it off again.
+        The signals of the active rewards are gathered from the signal kernel of their duration and summed at once."""
         value = 0
-        future_rewards = []
-        for step, reward, duration in self.active_rewards:
-            value += calculate_signal_strength(step, reward, duration)
-            if step * Settings.update_milliseconds/1000 < duration:
-                future_rewards.append((step+1, reward, duration))
+        if self.reward_queues:
+            for duration, queue in list(self.reward_queues.items()):
+                value += queue.advance()
+                if not len(queue):
+                    del self.reward_queues[duration]
 
         self.value = min(self.max_reward, max(-self.max_reward, value))  # limit cumulated reward
-        self.active_rewards = future_rewards
 
         if self.value != 0:
             self.need.satisfy(self.value)
@@ -208,6 +292,12 @@ def update():
         consumption.update()
 
 
+def skip(steps):
+    """Let all needs decay over the given number of steps, while no consumption is active"""
+    for need in needs.values():
+        need.update(steps)
+
+
 def reset():
     for need in needs.values():
         need.value = need.initial_value
@@ -215,7 +305,8 @@ def reset():
         need.pain = 0.0
 
     for consumption in consumptions.values():
-        consumption.events = []
+        consumption.value = 0
+        consumption.reward_queues = {}
 
 
 def get_needs():
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+"""
+Several agents in one process.
+
+The model modules keep the state of a single agent in their registries (needs.needs, modulators.modulators,
+events.events etc.). An Agent owns a private copy of all of this state, and swaps it into the registries while
+it is active, so every function of the model works on it unchanged.
+
+A Population simulates many copies of an agent side by side, with one row per agent in a set of numpy arrays.
+It covers needs, consumptions, modulators, aggregates and emotions; anticipated events and goals require the
+object model, so use Agent for those.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import copy
+
+import numpy as np
+
+from model import api, needs, modulators, events, emotions, goals
+from model.vectorized import NeedEngine, decay
+
+
+def _read_registries():
+    """Returns references to the state in the module registries of the model"""
+    return {"needs": dict(needs.needs),
+            "consumptions": dict(needs.consumptions),
+            "modulators": dict(modulators.modulators),
+            "aggregates": dict(modulators.aggregates),
+            "events": dict(events.events),
+            "emotions": dict(emotions.emotions),
+            "goal": goals.goal,
+            "step": api.step}
+
+
+def _write_registries(state):
+    """Replaces the contents of the module registries of the model"""
+    for registry, key in ((needs.needs, "needs"),
+                          (needs.consumptions, "consumptions"),
+                          (modulators.modulators, "modulators"),
+                          (modulators.aggregates, "aggregates"),
+                          (events.events, "events"),
+                          (emotions.emotions, "emotions")):
+        registry.clear()
+        registry.update(state[key])
+    emotions.invalidate_plan()  # the plan refers to the emotions of the previous agent
+    goals.set_goal(state["goal"], notify=False)
+    api.step = state["step"]
+
+
+class Agent(object):
+    """An agent with its own needs, consumptions, modulators, aggregates, events, emotions and goal.
+    New agents are copies of the given agent, or of the agent that is currently in the model registries.
+    Use the agent as a context manager to run any model function on it:
+
+        with agent:
+            api.consume("eat")
+            api.update()
+    """
+
+    def __init__(self, name=None, prototype=None):
+        self.name = name
+        state = _read_registries() if prototype is None else prototype.state
+        self.state = copy.deepcopy(state)
+        self._previous = []
+
+    def __enter__(self):
+        self._previous.append(_read_registries())
+        _write_registries(self.state)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.state = _read_registries()
+        _write_registries(self._previous.pop())
+
+    def update(self):
+        """Perform a simulation step for this agent"""
+        with self:
+            api.update()
+
+    def call(self, function_name, *args, **kwargs):
+        """Call a function of model.api for this agent"""
+        with self:
+            return getattr(api, function_name)(*args, **kwargs)
+
+    def get_data(self):
+        """Returns the same dict as api.get_data for this agent"""
+        with self:
+            return api.get_data()
+
+
+# the emotions of model.emotions, written for arrays of modulator, aggregate and need values; keep them in sync
+# with model.emotions (tests/test_population.py compares both)
+emotion_formulas = {
+    "joy": lambda m, a, n: np.maximum(0, m["valence"]) * m["arousal"],
+    "bliss": lambda m, a, n: np.maximum(0, m["valence"]) * m["resolution_level"],
+    "sadness": lambda m, a, n: np.maximum(0, -m["valence"] * (1 - m["arousal"])),
+    "anger": lambda m, a, n: np.maximum(0, -m["valence"]) * m["arousal"],
+    "fear": lambda m, a, n: np.zeros_like(m["valence"]),  # no anticipated events in a population
+    "hope": lambda m, a, n: np.zeros_like(m["valence"]),
+    "anxiety": lambda m, a, n: (1 - a["general_competence"]) * (1 - n["exploration"]),
+    "surprise": lambda m, a, n: np.minimum(1, 10 * n.pain("exploration")) * m["arousal"],
+    "curiosity": lambda m, a, n: (1 - n["exploration"]) * a["general_competence"],
+    "pride": lambda m, a, n: np.maximum(0, 1 - (2 * n["legitimacy"])),
+    "shame": lambda m, a, n: np.maximum(0, 1 - (2 * n["legitimacy"])),
+    "disgust": lambda m, a, n: np.minimum(1, 10 * n.pain("aesthetics")),
+    "shyness": lambda m, a, n: (1 - n["dominance"]) * (1 - n["affiliation"]) * (1 - n["competence"]),
+}
+
+
+class _Columns(object):
+    """Looks up the column of an element by name, e.g. columns["valence"] gives the valence of all agents"""
+
+    def __init__(self, index, values, pains=None):
+        self.index = index
+        self.values = values
+        self.pains = pains
+
+    def __getitem__(self, name):
+        return self.values[:, self.index[name]]
+
+    def pain(self, name):
+        return self.pains[:, self.index[name]]
+
+
+class Population(object):
+    """A number of agents that are stepped together. All agents start as copies of the prototype (an Agent, or
+    the agent in the model registries), and the state of all agents is kept in arrays with one row per agent,
+    so the cost of a step grows with the number of rows rather than with the number of objects."""
+
+    def __init__(self, size, prototype=None):
+        self.size = size
+        self.prototype = Agent(prototype=prototype)
+        self.step = 0
+
+        with self.prototype:
+            self.engine = NeedEngine(slots=4, size=size)
+            self.modulator_names = list(modulators.modulators.keys())
+            self.modulator_index = {name: i for i, name in enumerate(self.modulator_names)}
+            ms = list(modulators.modulators.values())
+            self.baseline = np.array([m.baseline for m in ms], dtype=float)
+            self.min = np.array([m.min for m in ms], dtype=float)
+            self.max = np.array([m.max for m in ms], dtype=float)
+            self.volatility = np.array([m.volatility for m in ms], dtype=float)
+            self.modulator_decay = np.array([m.decay for m in ms], dtype=float)
+            self.modulator_value = np.tile(np.array([m.value for m in ms], dtype=float), (size, 1))
+            self.aggregate_names = list(modulators.aggregates.keys())
+            self.aggregate_value = {a.name: np.full(size, float(a.value)) for a in modulators.aggregates.values()}
+            self.emotion_names = [name for name in emotions.emotions
+                                  if name in emotion_formulas and emotions.is_observed(name)]
+            self.emotion_value = {e.name: np.full(size, float(e.value)) for e in emotions.emotions.values()}
+
+    def trigger(self, consumption_name, agents=None, reward=None, duration=-1):
+        """Trigger a consumption for the given agent indices, or for all agents"""
+        self.engine.trigger(consumption_name, reward, duration, agents)
+
+    def consume(self, consumption_name, agents=None, reward=None):
+        """Unexpected gain or loss, like api.consume"""
+        if reward is None:
+            reward = self.engine.consumptions[self.engine.consumption_index[consumption_name]].default_reward
+        self.trigger(consumption_name, agents, reward)
+        self.trigger("disconfirmation", agents, reward if reward < 0 else reward / 2)
+
+    def trigger_at_random(self, probability, rng):
+        """Trigger every consumption of every agent independently with the given probability"""
+        hits = rng.random((self.size, len(self.engine.consumptions))) < probability
+        for i, consumption in enumerate(self.engine.consumptions):
+            agents = np.flatnonzero(hits[:, i])
+            if len(agents):
+                self.engine.trigger(consumption.name, agents=agents)
+
+    def update(self):
+        """Perform a simulation step for all agents, like api.update"""
+        self.step += 1
+        self.engine.update()
+        self._update_modulators()
+        self._update_emotions()
+
+    def _update_modulators(self):
+        """modulators.update for agents without goals"""
+        engine = self.engine
+        baseline, low, high = self.baseline, self.min, self.max
+        value = self.modulator_value
+
+        # Modulator.update
+        above = value >= baseline
+        with np.errstate(divide="ignore", invalid="ignore"):
+            up = decay((value - baseline) / (high - baseline), self.modulator_decay) * (high - baseline) + baseline
+            down = baseline - decay((baseline - value) / (baseline - low), self.modulator_decay) * (baseline - low)
+        self.modulator_value = value = np.where(above, up, down)
+
+        aggregates = self.aggregate_value
+        need_values = _Columns(engine.need_index, engine.value)
+        maximum = engine.weight.max()  # no leading motive without a goal
+
+        def marginal_sum(values):
+            """common.marginal_sum over the needs of every agent"""
+            return maximum * (1 - np.prod(1 - values / maximum, axis=1))
+
+        aggregates["combined_pain"] = marginal_sum(engine.pain)
+        aggregates["combined_pleasure"] = marginal_sum(engine.pleasure)
+        self._approach("valence", aggregates["combined_pleasure"] / maximum - aggregates["combined_pain"] / maximum)
+        aggregates["combined_urge"] = marginal_sum(engine.urge) / maximum
+        aggregates["combined_urgency"] = marginal_sum(engine.urgency) / maximum
+        self._approach("arousal", (aggregates["combined_urge"] + aggregates["combined_urgency"]) - 1)
+
+        aggregates["general_competence"] = need_values["competence"].copy()
+        aggregates["epistemic_competence"] = aggregates["general_competence"].copy()
+        self._approach("dominance", (aggregates["general_competence"] + aggregates["epistemic_competence"]) - 1)
+
+        self._approach("resolution_level", 1 - self._normalized("arousal"))
+
+        exploration_weight = engine.weight[engine.need_index["exploration"]]
+        exploration_urge = engine.urge[:, engine.need_index["exploration"]]
+        target = self._normalized("arousal") - exploration_urge + aggregates["general_competence"]
+        max_target = 1 - 0 + 1
+        min_target = -1 - exploration_weight
+        self._approach("focus", ((target - min_target) * 2) / (max_target - min_target) - 1)
+
+        target = exploration_urge + aggregates["epistemic_competence"]
+        max_target = exploration_weight + 1.0
+        min_target = exploration_weight
+        self._approach("securing_rate", ((target - min_target) * 2) / (max_target - min_target) - 1)
+
+    def _normalized(self, name):
+        """Modulator.get_normalized_value for all agents"""
+        i = self.modulator_index[name]
+        value, baseline = self.modulator_value[:, i], self.baseline[i]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(value > baseline, (value - baseline) / (self.max[i] - baseline),
+                            (value - baseline) / (self.min[i] - baseline))
+
+    def _approach(self, name, target):
+        """Modulator.approach for all agents"""
+        i = self.modulator_index[name]
+        baseline = self.baseline[i]
+        target = np.where(target > 0, target * (self.max[i] - baseline) + baseline,
+                          target * (baseline - self.min[i]) + baseline)
+        value = self.modulator_value[:, i]
+        diff = (target - value) * self.volatility[i]
+        self.modulator_value[:, i] = np.minimum(self.max[i], np.maximum(self.min[i], value + diff))
+
+    def _update_emotions(self):
+        m = _Columns(self.modulator_index, self.modulator_value)
+        n = _Columns(self.engine.need_index, self.engine.value, self.engine.pain)
+        for name in self.emotion_names:
+            self.emotion_value[name] = emotion_formulas[name](m, self.aggregate_value, n)
+
+    def get_need(self, name, field="value"):
+        """Returns an array with a field of a need (value, pleasure, pain, urge or urgency) for all agents"""
+        return getattr(self.engine, field)[:, self.engine.need_index[name]]
+
+    def get_consumption(self, name):
+        """Returns an array with the current value of a consumption for all agents"""
+        return self.engine.consumption_value[:, self.engine.consumption_index[name]]
+
+    def get_modulator(self, name):
+        """Returns an array with the value of a modulator for all agents"""
+        return self.modulator_value[:, self.modulator_index[name]]
+
+    def get_aggregate(self, name):
+        """Returns an array with the value of an aggregate for all agents"""
+        return self.aggregate_value[name]
+
+    def get_emotion(self, name):
+        """Returns an array with the value of an emotion for all agents"""
+        return self.emotion_value[name]
+
+    def get_agent(self, index):
+        """Returns a copy of a single member of the population as an Agent, e.g. to continue it with events"""
+        agent = Agent(prototype=self.prototype)
+        engine = self.engine
+        with agent:
+            api.step = self.prototype.state["step"] + self.step
+            for i, need in enumerate(engine.needs):
+                copied = needs.needs[need.name]
+                for field in ("value", "pleasure", "pain", "urge", "urgency"):
+                    setattr(copied, field, float(getattr(engine, field)[index, i]))
+            for i, consumption in enumerate(engine.consumptions):
+                copied = needs.consumptions[consumption.name]
+                copied.value = float(engine.consumption_value[index, i])
+                slots = np.flatnonzero(engine.reward_active[index, i])
+                copied.active_rewards = [(int(engine.reward_step[index, i, s]),
+                                          float(engine.reward_amount[index, i, s]),
+                                          float(engine.reward_duration[index, i, s])) for s in slots]
+            for i, name in enumerate(self.modulator_names):
+                modulators.modulators[name].value = float(self.modulator_value[index, i])
+            for name, value in self.aggregate_value.items():
+                modulators.aggregates[name].value = float(value[index])
+            for name, value in self.emotion_value.items():
+                emotions.emotions[name].value = float(value[index])
+                emotions.emotions[name].input_values = None
+        return agent
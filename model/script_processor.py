@@ -2,12 +2,186 @@
 
 """
 Takes a script and triggers events via the api, to produce a pre-recorded sequence of events.
+
+A script is a list of cues (see storyboard.py), e.g.
+
+    {"t": 4229767, "e": 4231394, "sub": "Hi.", "x": 'consume("affiliation")'}
+
+compile_script() turns it into a Schedule, sorted by simulation step, and a Player walks through the schedule with
+a cursor while the simulation runs, so a tick costs constant time, however long the script is. The x tags are
+parsed once when the script is compiled; they may only call the functions in `actions`, with literal arguments.
+Long scripts can be read from a file with one JSON cue per line (read_script).
 """
 
 __author__ = 'joscha'
 __date__ = '4/6/16'
 
+import ast
+import bisect
+import functools
+import json
+
+from configuration import Settings
+from model import api
 from model.storyboard import script
 
+# api functions that a script may call
+actions = ("create_event", "change_event", "drop_event", "remove_event", "execute_event", "consume",
+           "set_goal", "drop_goal")
+
+SUBTITLE, SUBTITLE_END, EXECUTE = "subtitle", "subtitle_end", "execute"
+
+schedule = None  # the schedule of the storyboard script, see reset()
+
+
 def reset():
     """Set up an orderly data structure"""
+    global schedule
+    schedule = compile_script(script)
+
+
+@functools.lru_cache(maxsize=4096)  # scripts tend to repeat the same actions
+def parse_call(source):
+    """Parses an x tag like 'consume("eat", 0.5)' or 'api.set_goal("lunch")' into the name of the api function,
+    its arguments and keyword arguments. Nothing is evaluated except literals."""
+    try:
+        call = ast.parse(source.strip(), mode="eval").body
+    except SyntaxError:
+        raise ValueError("cannot parse script action: %s" % source)
+    if not isinstance(call, ast.Call):
+        raise ValueError("script action is not a call: %s" % source)
+    function = call.func
+    if isinstance(function, ast.Attribute) and isinstance(function.value, ast.Name) and function.value.id == "api":
+        name = function.attr
+    elif isinstance(function, ast.Name):
+        name = function.id
+    else:
+        raise ValueError("script action does not call the api: %s" % source)
+    if name not in actions:
+        raise ValueError("script action %s is not one of %s" % (name, ", ".join(actions)))
+    try:
+        args = tuple(ast.literal_eval(arg) for arg in call.args)
+        kwargs = {keyword.arg: ast.literal_eval(keyword.value) for keyword in call.keywords}
+    except ValueError:
+        raise ValueError("arguments of script actions must be literals: %s" % source)
+    return name, args, kwargs
+
+
+def time_to_step(milliseconds, origin=0):
+    """The simulation step at which a time of the script (in ms, counted from the origin) is reached"""
+    return int(round((milliseconds - origin) / Settings.update_milliseconds))
+
+
+class Schedule(object):
+    """The entries of a compiled script, sorted by step. Each entry is (step, kind, cue number, data):
+    subtitles start and end, and calls to the api are executed, with data = (name, args, kwargs)."""
+
+    def __init__(self, entries, origin=0):
+        order = {SUBTITLE: 0, EXECUTE: 1, SUBTITLE_END: 2}
+        entries.sort(key=lambda entry: (entry[0], entry[2], order[entry[1]]))
+        self.entries = entries
+        self.steps = [entry[0] for entry in entries]
+        self.origin = origin
+        # the longest subtitle, so that we only have to look back that far for the subtitles that are shown
+        self.longest = max([entry[3][1] - entry[0] for entry in entries if entry[1] == SUBTITLE] or [0])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def index(self, step):
+        """Position of the first entry after the given step"""
+        return bisect.bisect_right(self.steps, step)
+
+    def subtitles_at(self, step):
+        """Returns the subtitles that are shown at a step, as {cue number: text}"""
+        shown = {}
+        i = self.index(step)
+        first = bisect.bisect_left(self.steps, step - self.longest)
+        for entry_step, kind, cue, data in self.entries[first:i]:
+            if kind == SUBTITLE and data[1] > step:
+                shown[cue] = data[0]
+        return shown
+
+
+def compile_cue(cue, number, origin=0):
+    """Returns the schedule entries of a single cue"""
+    start = time_to_step(cue["t"], origin)
+    if "e" in cue:
+        end = time_to_step(cue["e"], origin)
+    elif "d" in cue:
+        end = time_to_step(cue["t"] + cue["d"], origin)
+    else:
+        end = start + 1
+    entries = []
+    if "sub" in cue:
+        entries.append((start, SUBTITLE, number, (cue["sub"], end)))
+        entries.append((end, SUBTITLE_END, number, None))
+    calls = cue.get("x", [])
+    for call in [calls] if isinstance(calls, str) else calls:
+        entries.append((start, EXECUTE, number, parse_call(call)))
+    return entries
+
+
+def compile_script(cues, origin=0):
+    """Compiles a list (or any iterable) of cues into a Schedule; origin is the time of the script (in ms) that
+    corresponds to step 0 of the simulation"""
+    entries = []
+    for number, cue in enumerate(cues):
+        entries.extend(compile_cue(cue, number, origin))
+    return Schedule(entries, origin)
+
+
+def read_script(path):
+    """Reads the cues of a script from a file with one JSON object per line, without loading the whole file"""
+    with open(path) as script_file:
+        for line in script_file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield json.loads(line)
+
+
+def load_script(path, origin=0):
+    """Compiles a script from a file with one JSON object per line"""
+    return compile_script(read_script(path), origin)
+
+
+class Player(object):
+    """Plays a schedule along with a simulation: advance(step) executes all entries up to the step.
+    subtitles contains the subtitles that are currently shown, as {cue number: text}."""
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.cursor = 0  # position of the next entry in the schedule
+        self.subtitles = {}
+
+    def next_step(self):
+        """The step of the next entry, or None at the end of the schedule"""
+        if self.cursor < len(self.schedule):
+            return self.schedule.steps[self.cursor]
+        return None
+
+    def advance(self, step):
+        """Executes all entries up to and including the step; returns them"""
+        entries = self.schedule.entries
+        start = self.cursor
+        while self.cursor < len(entries) and entries[self.cursor][0] <= step:
+            _, kind, cue, data = entries[self.cursor]
+            self.cursor += 1
+            if kind == EXECUTE:
+                name, args, kwargs = data
+                getattr(api, name)(*args, **kwargs)
+            elif kind == SUBTITLE:
+                self.subtitles[cue] = data[0]
+            else:
+                self.subtitles.pop(cue, None)
+        return entries[start:self.cursor]
+
+    def seek(self, step):
+        """Continue the schedule after the given step. Calls to the api between the current position and the
+        step are not executed."""
+        self.cursor = self.schedule.index(step)
+        self.subtitles = self.schedule.subtitles_at(step)
+
+    def seek_time(self, milliseconds):
+        """Continue the schedule after the given time of the script"""
+        self.seek(time_to_step(milliseconds, self.schedule.origin))
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""
+Imports subtitles, transcripts and annotations as storyboard scripts.
+
+The readers turn SRT and WebVTT subtitles and CSV annotation files into the cues of script_processor (t, e, sub, x),
+one cue at a time, so the file is never loaded as a whole. CSV files name their columns in the first row:
+t or start, e or end, d or duration, sub or text, and x or action; times are either milliseconds or timestamps
+like 01:10:29,767.
+
+load() compiles a file into a schedule, and keeps the result in a cache on disk, keyed by the hash of the file,
+so a large corpus is only parsed once. The cache is a directory of JSON files that only the user can access.
+The arguments of calls are cached as the source text of Python literals, so tuples and sets come back as they were
+compiled; when they are read, they are parsed with ast.literal_eval and checked against script_processor.actions
+again, so nothing but literals is ever loaded from the cache. A cache that cannot be written is skipped.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import ast
+import csv
+import hashlib
+import json
+import os
+import re
+
+from configuration import Settings
+from model import script_processor
+
+cache_directory = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                               "motivation_machine", "schedules")
+CACHE_VERSION = 3  # increase if the layout of compiled schedules changes
+
+timestamp_pattern = re.compile(r"(?:(\d+):)?(\d+):(\d+)(?:[,.](\d{1,3}))?$")
+
+
+def parse_timestamp(text):
+    """Returns the milliseconds of a timestamp like 01:10:29,767 (SRT), 10:29.767 (VTT) or 4229767 (ms)"""
+    text = text.strip()
+    match = timestamp_pattern.match(text)
+    if not match:
+        return float(text)
+    hours, minutes, seconds, fraction = match.groups()
+    milliseconds = int((fraction or "0").ljust(3, "0"))
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + milliseconds
+
+
+def read_subtitles(path):
+    """Reads the cues of an SRT or WebVTT file. Cue numbers, identifiers, cue settings, NOTE and STYLE blocks
+    are ignored; the lines of text of a cue are joined with line breaks."""
+    with open(path, encoding="utf-8-sig", errors="replace") as subtitle_file:
+        cue = None
+        lines = []
+        for line in subtitle_file:
+            line = line.strip()
+            if "-->" in line:
+                start, _, end = line.partition("-->")
+                cue = {"t": parse_timestamp(start), "e": parse_timestamp(end.split()[0])}
+                lines = []
+            elif not line:
+                if cue is not None and lines:
+                    cue["sub"] = "\n".join(lines)
+                    yield cue
+                cue = None
+            elif cue is not None:
+                lines.append(line)
+        if cue is not None and lines:
+            cue["sub"] = "\n".join(lines)
+            yield cue
+
+
+csv_columns = {"t": "t", "start": "t", "e": "e", "end": "e", "d": "d", "duration": "d",
+               "sub": "sub", "text": "sub", "x": "x", "action": "x"}
+
+
+def read_csv(path):
+    """Reads the cues of a CSV file with a header row; several actions in a cell are separated by semicolons"""
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as csv_file:
+        for row in csv.DictReader(csv_file):
+            cue = {}
+            for column, value in row.items():
+                key = csv_columns.get((column or "").strip().lower())
+                if key is None or value is None or not value.strip():
+                    continue
+                if key in ("t", "e"):
+                    cue[key] = parse_timestamp(value)
+                elif key == "d":
+                    cue[key] = float(value)
+                elif key == "x":
+                    cue[key] = [action for action in value.split(";") if action.strip()]
+                else:
+                    cue[key] = value
+            if "t" in cue:
+                yield cue
+
+
+readers = {".srt": read_subtitles, ".vtt": read_subtitles, ".csv": read_csv,
+           ".jsonl": script_processor.read_script}
+
+
+def read_cues(path):
+    """Reads the cues of a file, according to its extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in readers:
+        raise ValueError("unknown script format: %s" % path)
+    return readers[extension](path)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as hashed_file:
+        for chunk in iter(lambda: hashed_file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def private_cache_directory():
+    """Creates the cache directory if necessary, and returns it if only the current user can write and read it;
+    otherwise returns None, and the cache is not used"""
+    try:
+        os.makedirs(cache_directory, mode=0o700, exist_ok=True)
+        status = os.stat(cache_directory)
+    except OSError:
+        return None
+    if hasattr(os, "getuid") and (status.st_uid != os.getuid() or status.st_mode & 0o077):
+        return None
+    return cache_directory
+
+
+def encode_literal(value):
+    """Returns the source text of a literal; raises ValueError if it cannot be parsed back, e.g. for inf"""
+    text = repr(value)
+    ast.literal_eval(text)
+    return text
+
+
+def encode_schedule(schedule):
+    """Returns a compiled schedule as a dict of JSON types"""
+    entries = []
+    for step, kind, cue, data in schedule.entries:
+        if kind == script_processor.EXECUTE:
+            name, args, kwargs = data
+            data = [name, encode_literal(args), encode_literal(kwargs)]
+        elif data is not None:
+            data = list(data)
+        entries.append([step, kind, cue, data])
+    return {"version": CACHE_VERSION, "origin": schedule.origin, "entries": entries}
+
+
+def decode_schedule(data):
+    """Turns the result of encode_schedule back into a schedule; raises ValueError if it is not a valid schedule"""
+    if data.get("version") != CACHE_VERSION:
+        raise ValueError("schedule has a different version")
+    entries = []
+    for step, kind, cue, entry_data in data["entries"]:
+        if kind == script_processor.SUBTITLE:
+            text, end = entry_data
+            entry_data = (str(text), int(end))
+        elif kind == script_processor.EXECUTE:
+            name, args, kwargs = entry_data
+            if name not in script_processor.actions:
+                raise ValueError("script action %s is not one of %s" % (name, ", ".join(script_processor.actions)))
+            args, kwargs = ast.literal_eval(args), ast.literal_eval(kwargs)
+            if not isinstance(args, tuple) or not isinstance(kwargs, dict):
+                raise ValueError("arguments of script actions must be a tuple and a dict")
+            entry_data = (name, args, kwargs)
+        elif kind == script_processor.SUBTITLE_END:
+            entry_data = None
+        else:
+            raise ValueError("unknown kind of schedule entry: %s" % kind)
+        entries.append((int(step), kind, int(cue), entry_data))
+    return script_processor.Schedule(entries, data["origin"])
+
+
+def load(path, origin=0, use_cache=True):
+    """Compiles a subtitle, CSV or JSON lines file into a schedule for script_processor.Player.
+    Compiled schedules are cached in cache_directory; the key covers the contents of the file, the origin and
+    the length of a simulation step."""
+    directory = private_cache_directory() if use_cache else None
+    if directory is None:
+        return script_processor.compile_script(read_cues(path), origin)
+
+    key = "%s-%s-%s-%d" % (file_hash(path), origin, Settings.update_milliseconds, CACHE_VERSION)
+    cache_path = os.path.join(directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, encoding="utf-8") as cache_file:
+                return decode_schedule(json.load(cache_file))
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            pass  # compile it again
+
+    schedule = script_processor.compile_script(read_cues(path), origin)
+    try:
+        encoded = json.dumps(encode_schedule(schedule))
+    except ValueError:  # literals that cannot be written as source text, e.g. inf
+        return schedule
+    temporary_path = "%s.%d.tmp" % (cache_path, os.getpid())
+    try:
+        with open(temporary_path, "w", encoding="utf-8") as cache_file:
+            cache_file.write(encoded)
+        os.replace(temporary_path, cache_path)  # other processes never see an incomplete file
+    except OSError:  # e.g. a full or read-only cache directory; the schedule is fine without the cache
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+    return schedule
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+"""
+Array-backed engine for the needs and consumptions of the agent.
+
+The object model in model.needs calls the scalar helpers from model.common once per element and tick.
+The NeedEngine keeps the same state in numpy arrays, so that a whole tick takes a handful of batched operations.
+It follows the object path step by step, so both give the same results within floating point tolerance.
+For a single agent, the fixed cost of the numpy calls makes a tick slower than the object path; the engine pays off
+when it simulates many agents at once, see model.population.Population.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import numpy as np
+
+from configuration import Settings
+import model.needs as needs
+
+
+def get_inverted_decay_value(y):
+    """Array version of model.common.get_inverted_decay_value"""
+    y = np.asarray(y, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = np.clip(np.log((1.0 - y) / y) / 12.0 + 0.5, 0.0, 1.0)
+    return np.where(y >= 1, 0.0, np.where(y <= 0, 1.0, x))
+
+
+def decay(previous_value, decay_time):
+    """Array version of model.common.decay; negative decay times leave the value unchanged"""
+    return decay_n(previous_value, decay_time, 1)
+
+
+def decay_n(previous_value, decay_time, steps=1):
+    """Array version of model.common.decay_n; steps may be an array, too"""
+    interval = Settings.update_milliseconds / 1000
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = get_inverted_decay_value(previous_value) + steps * interval / decay_time
+        value = np.where(x >= 1, 0.0, 1 - 1 / (1 + np.exp(-12 * (x - 0.5))))
+    return np.where(decay_time < 0, previous_value, value)
+
+
+def calculate_signal_strength(step, total_amount, duration):
+    """Array version of model.common.calculate_signal_strength"""
+    step_length = Settings.update_milliseconds / 1000 * 3.5 / duration
+    t1 = step * step_length
+    t2 = (step + 1) * step_length
+    amount = np.exp(-t1 * t1 / 2) - np.exp(-t2 * t2 / 2)
+    return amount * total_amount / duration * 3.5
+
+
+class NeedEngine(object):
+    """Holds values, pleasure, pain and the queues of active rewards of all needs and consumptions in arrays.
+    Use load() and store() to exchange the state with the Need and Consumption objects, and update() to
+    perform a tick on the arrays alone. Rewards are queued in a fixed number of slots per consumption,
+    which grows whenever a consumption runs out of free slots.
+    If a size is given, the engine simulates that many copies of the needs side by side, with the agents
+    along the first axis of every dynamic array; load() and store() only work for a single agent."""
+
+    def __init__(self, need_list=None, consumption_list=None, slots=8, size=None):
+        self.needs = list(needs.needs.values()) if need_list is None else list(need_list)
+        self.consumptions = list(needs.consumptions.values()) if consumption_list is None else list(consumption_list)
+        self.need_index = {need.name: i for i, need in enumerate(self.needs)}
+        self.consumption_index = {c.name: i for i, c in enumerate(self.consumptions)}
+
+        # static parameters of the needs
+        self.weight = self._gather(self.needs, "weight")
+        self.decay = self._gather(self.needs, "decay")
+        self.pleasure_decay = self._gather(self.needs, "pleasure_decay")
+        self.pain_decay = self._gather(self.needs, "pain_decay")
+        self.gain = self._gather(self.needs, "gain")
+        self.pleasure_sensitivity = self._gather(self.needs, "pleasure_sensitivity")
+
+        # dynamic values of the needs
+        self.value = self._gather(self.needs, "value")
+        self.pleasure = self._gather(self.needs, "pleasure")
+        self.pain = self._gather(self.needs, "pain")
+        self.urge = self._gather(self.needs, "urge")
+        self.urgency = self._gather(self.needs, "urgency")
+
+        # consumptions and their reward queues
+        self.consumption_need = np.array([self.need_index[c.need.name] for c in self.consumptions], dtype=int)
+        self.max_reward = self._gather(self.consumptions, "max_reward")
+        self.consumption_value = self._gather(self.consumptions, "value")
+        self.reward_step = np.zeros((len(self.consumptions), slots))
+        self.reward_amount = np.zeros((len(self.consumptions), slots))
+        self.reward_duration = np.ones((len(self.consumptions), slots))
+        self.reward_active = np.zeros((len(self.consumptions), slots), dtype=bool)
+
+        # consumptions act on their needs one after the other, so we apply them in layers in which every need
+        # occurs at most once, and keep the order of the consumptions within each need
+        self.layers = []
+        seen = {}
+        for i, n in enumerate(self.consumption_need):
+            layer = seen.get(n, 0)
+            seen[n] = layer + 1
+            if layer == len(self.layers):
+                self.layers.append([])
+            self.layers[layer].append(i)
+        self.layers = [np.array(layer, dtype=int) for layer in self.layers]
+
+        self.load()
+        self.shape = ()
+        if size is not None:
+            self.shape = (size,)
+            for attribute in ("value", "pleasure", "pain", "urge", "urgency", "consumption_value",
+                              "reward_step", "reward_amount", "reward_duration", "reward_active"):
+                array = getattr(self, attribute)
+                setattr(self, attribute, np.tile(array, (size,) + (1,) * array.ndim))
+        decay_times = np.stack((self.decay, self.pleasure_decay, self.pain_decay))
+        self.decay_times = decay_times.reshape((3,) + (1,) * len(self.shape) + (len(self.needs),))
+
+    @staticmethod
+    def _gather(elements, attribute):
+        return np.array([getattr(e, attribute) for e in elements], dtype=float)
+
+    def load(self):
+        """Read the dynamic state from the Need and Consumption objects"""
+        self.value[:] = [n.value for n in self.needs]
+        self.pleasure[:] = [n.pleasure for n in self.needs]
+        self.pain[:] = [n.pain for n in self.needs]
+        self.urge[:] = [n.urge for n in self.needs]
+        self.urgency[:] = [n.urgency for n in self.needs]
+        self.consumption_value[:] = [c.value for c in self.consumptions]
+        self.reward_active[:] = False
+        for i, consumption in enumerate(self.consumptions):
+            for step, reward, duration in consumption.active_rewards:
+                self._queue(i, step, reward, duration)
+
+    def store(self):
+        """Write the dynamic state back into the Need and Consumption objects"""
+        for i, need in enumerate(self.needs):
+            need.value = float(self.value[i])
+            need.pleasure = float(self.pleasure[i])
+            need.pain = float(self.pain[i])
+            need.urge = float(self.urge[i])
+            need.urgency = float(self.urgency[i])
+        for i, consumption in enumerate(self.consumptions):
+            consumption.value = float(self.consumption_value[i])
+            slots = np.flatnonzero(self.reward_active[i])
+            consumption.active_rewards = [(int(self.reward_step[i, s]), float(self.reward_amount[i, s]),
+                                           float(self.reward_duration[i, s])) for s in slots]
+
+    def trigger(self, consumption_name, reward=None, duration=-1, agents=None):
+        """Queue a reward for a consumption, like Consumption.trigger does for the object model.
+        With several agents, the reward goes to the given agent indices, or to all of them."""
+        i = self.consumption_index[consumption_name]
+        if reward is None:
+            reward = self.consumptions[i].default_reward
+        if duration == -1:
+            duration = self.consumptions[i].default_duration
+        if self.shape:
+            agents = np.arange(self.shape[0]) if agents is None else np.asarray(agents, dtype=int).ravel()
+            if len(agents):
+                self._queue(i, 0, reward, duration, (agents,))
+        else:
+            self._queue(i, 0, reward, duration)
+
+    def _queue(self, i, step, reward, duration, agents=()):
+        """Put a reward into the first free slot of consumption i, for the rows selected by agents"""
+        active = self.reward_active[agents + (i,)]
+        if active.all(axis=-1).any():
+            self._grow()
+            active = self.reward_active[agents + (i,)]
+        index = agents + (i, np.argmin(active, axis=-1))
+        self.reward_step[index] = step
+        self.reward_amount[index] = reward
+        self.reward_duration[index] = duration
+        self.reward_active[index] = True
+
+    def _grow(self):
+        """Double the number of reward slots of all consumptions"""
+        slots = self.reward_active.shape[-1]
+        pad = [(0, 0)] * (self.reward_active.ndim - 1) + [(0, slots)]
+        self.reward_step = np.pad(self.reward_step, pad)
+        self.reward_amount = np.pad(self.reward_amount, pad)
+        self.reward_duration = np.pad(self.reward_duration, pad, constant_values=1.0)
+        self.reward_active = np.pad(self.reward_active, pad)
+
+    def update(self):
+        """Perform one tick of needs.update() on the arrays"""
+        interval = Settings.update_milliseconds / 1000
+
+        # Need.update; value, pleasure and pain decay in a single batch
+        decayed = decay(np.stack((self.value, self.pleasure / self.weight, self.pain / self.weight)),
+                        self.decay_times)
+        self.value = decayed[0]
+        self.pleasure = decayed[1] * self.weight
+        self.pain = decayed[2] * self.weight
+        self.urge = self.weight * np.clip(1 - self.value, 0.0, 1.0) ** 2
+        time_left = get_inverted_decay_value(self.value) * self.decay
+        self.urgency = self.weight * np.maximum(0, 300 - time_left) / 300 ** 2
+        self.pain = np.maximum(self.pain, np.clip(1 - 20 * self.value, 0.0, 1.0) ** 2 * self.weight)
+
+        # Consumption.update
+        signal = calculate_signal_strength(self.reward_step, self.reward_amount, self.reward_duration)
+        value = np.where(self.reward_active, signal, 0.0).sum(axis=-1)
+        self.consumption_value = np.clip(value, -self.max_reward, self.max_reward)
+        self.reward_active &= self.reward_step * interval < self.reward_duration
+        self.reward_step += 1
+
+        for layer in self.layers:
+            n = self.consumption_need[layer]
+            value = self.consumption_value[..., layer]
+            weight = self.weight[n]
+            old_value = self.value[..., n]
+            old_pleasure = self.pleasure[..., n]
+            old_pain = self.pain[..., n]
+            satisfied = value != 0
+            # Need.satisfy, used for rewards of either sign
+            delta = np.minimum(1 - old_value, np.abs(value) * self.gain[n])
+            pleasure = np.minimum(np.maximum(old_pleasure, delta * self.pleasure_sensitivity[n] * weight), weight)
+            # Need.frustrate(0) only clips the pain signal
+            pain = np.minimum(np.maximum(old_pain, 0.0), weight)
+            self.value[..., n] = np.where(satisfied, old_value + delta, old_value)
+            self.pleasure[..., n] = np.where(satisfied, pleasure, old_pleasure)
+            self.pain[..., n] = np.where(satisfied, old_pain, pain)
+
+    def run(self, steps):
+        """Perform a number of ticks without synchronizing with the object model"""
+        for _ in range(steps):
+            self.update()
+
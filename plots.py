@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+Diagrams of the simulation data
+"""
+
+__author__ = 'joscha'
+__date__ = '3/15/16'
+
+import numpy as np
+
+from helper_widgets import Diagram
+from summaries import Pyramid, StreamingHistogram
+
+
+class ValuePlot(Diagram):
+
+    key = "value"
+    window_title = "Values"
+
+    number_of_data_points = 50
+
+    series = (("needs", "food", "value", "blue"),
+              ("consumptions", "eat", "value", "green"),
+              ("consumptions", "success", "value", "red"))
+
+    def setup(self):
+        self.lines = [self.subplot.plot([], [], color=color, linewidth=1.0)[0] for _, _, _, color in self.series]
+        self.subplot.set_xlim(0, self.number_of_data_points - 1)
+        self.subplot.set_ylim(0, 1)
+        self.artists = list(self.lines)
+
+    def sample(self):
+        return [self.simulation.log.get(category, element, value, last=self.number_of_data_points).copy()
+                for category, element, value, _ in self.series]
+
+    def plot(self, series):
+        rescale = False
+        low, high = self.subplot.get_ylim()
+        for line, t in zip(self.lines, series):
+            line.set_data(np.arange(len(t)), t)
+            if len(t) and (t.min() < low or t.max() > high):  # grow the axis instead of clipping the line
+                low, high = min(low, t.min()), max(high, t.max())
+                rescale = True
+        if rescale:
+            self.subplot.set_ylim(low, high)
+        return rescale
+
+
+class HistoryPlot(Diagram):
+    """The whole run, as the minimum, maximum and mean of the values at screen resolution"""
+
+    key = "history"
+    window_title = "History"
+
+    column = ("needs", "food", "value")
+    buckets = 500  # number of points across the diagram
+
+    def setup(self):
+        self.pyramid = self.attach(Pyramid(self.simulation.log, [self.column]))
+        self.min_line, = self.subplot.plot([], [], color="lightblue", linewidth=1.0)
+        self.max_line, = self.subplot.plot([], [], color="lightblue", linewidth=1.0)
+        self.mean_line, = self.subplot.plot([], [], color="blue", linewidth=1.0)
+        self.subplot.set_xlim(0, 1000)
+        self.subplot.set_ylim(0, 1)
+        self.artists = [self.min_line, self.max_line, self.mean_line]
+
+    def sample(self):
+        return self.pyramid.get(self.column, self.buckets)  # new arrays
+
+    def plot(self, summary):
+        steps, minimum, maximum, mean = summary
+        self.min_line.set_data(steps, minimum)
+        self.max_line.set_data(steps, maximum)
+        self.mean_line.set_data(steps, mean)
+        if len(steps) and steps[-1] > self.subplot.get_xlim()[1]:
+            self.subplot.set_xlim(0, 2 * steps[-1])  # leave room, so we do not have to rescale in every frame
+            return True
+        return False
+
+
+class ValueHistogram(Diagram):
+    """A modified PlotWindow to display an updateable histogram of the whole run"""
+    key = "value distribution"
+    window_title = "Distribution of Values"
+
+    column = ("needs", "food", "value")
+
+    def setup(self):
+        self.histogram = self.attach(StreamingHistogram(self.simulation.log, self.column, bins=10))
+        bins = self.histogram.edges
+        self.bars = self.subplot.bar(bins[:-1], np.zeros(len(bins) - 1), width=np.diff(bins),
+                                     align="edge", color="blue")
+        self.subplot.set_xlim(bins[0], bins[-1])
+        self.subplot.set_ylim(0, 1)
+        self.artists = list(self.bars)
+
+    def sample(self):
+        return self.histogram.counts.copy()
+
+    def plot(self, counts):
+        for bar, count in zip(self.bars, counts):
+            bar.set_height(count)
+        if counts.max() > self.subplot.get_ylim()[1]:
+            self.subplot.set_ylim(0, 2 * counts.max())  # leave room, so we do not have to rescale in every frame
+            return True
+        return False
+
+
+diagrams = [ValuePlot, HistoryPlot, ValueHistogram]
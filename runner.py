@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runs a simulation in a worker thread, at a given speed relative to real time.
+
+The GUI does not step the simulation itself; it samples the state at its own frame rate. Everything that reads
+the simulation from another thread has to hold the lock of the runner, which is only released between steps.
+If a step raises an exception, the worker stops, and keeps the exception in Runner.error for the GUI.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import threading
+import time
+import traceback
+
+from configuration import Settings
+
+
+class Runner(object):
+    """Steps a simulation in a background thread.
+    speed is the simulated time per real time (1: real time, 100: a hundred times faster), 0 runs as fast as
+    possible. The speed may be changed while the runner is active."""
+
+    def __init__(self, simulation, speed=1.0):
+        self.simulation = simulation
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.steps_per_second = 0.0  # measured over the last second
+        self.error = None  # the exception that stopped the worker, if any
+
+    def start(self):
+        if self.running:
+            return
+        self.error = None
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="simulation", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the worker and waits until the current step is finished"""
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+        self.steps_per_second = 0.0
+
+    def step(self):
+        """Performs a single step in the calling thread; returns False if the simulation is done"""
+        with self.lock:
+            return self.simulation.step()
+
+    def _run(self):
+        start = time.perf_counter()
+        steps = 0  # steps since start, for the pacing
+        speed = self.speed
+        window_start, window_steps = start, 0  # for the measurement of the step rate
+
+        while self.running:
+            try:
+                if not self.step():
+                    self.running = False
+                    break
+            except Exception as error:  # e.g. a script action with an unknown event id
+                traceback.print_exc()
+                with self.lock:
+                    self.error = error
+                    self.running = False
+                    self.steps_per_second = 0.0
+                break
+            steps += 1
+            window_steps += 1
+
+            now = time.perf_counter()
+            if now - window_start >= 1.0:
+                self.steps_per_second = window_steps / (now - window_start)
+                window_start, window_steps = now, 0
+
+            if self.speed != speed:  # start a new pace when the speed changes
+                speed, start, steps = self.speed, now, 0
+            if speed > 0:
+                delay = start + steps * Settings.update_milliseconds / 1000 / speed - now
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -1.0:  # we cannot keep up; do not try to catch up with more than a second
+                    start, steps = now, 0
+            elif steps % 100 == 0:
+                time.sleep(0)  # let other threads (e.g. the GUI) have the interpreter
@@ -7,21 +7,33 @@ Running the actual simulation experiment
 __author__ = 'joscha'
 __date__ = '3/15/16'
 
-from random import randint, random
-import math
-
-from widgets import Settings
-from helper_widgets import Diagram
-
-
-from model import api
+import array
+import contextlib
+import heapq
+from random import SystemRandom
+
+import numpy as np
+
+from configuration import Settings
+from datalog import DataLog
+from model import api, checkpoint
+from model.arbitration import Arbiter
+from model.script_processor import Player
 from model.needs import needs, consumptions
 from model.modulators import modulators, aggregates
 from model.emotions import emotions
 
 
 class Simulation(object):
-    def __init__(self):
+    """Runs the agent and triggers its consumptions at random.
+    Every consumption is triggered with the trigger_probability in each step. Instead of drawing a random number
+    per consumption and step, we draw the waiting times between triggers in blocks from a geometric distribution,
+    using a generator that is seeded per simulation, so a run can be reproduced from its seed."""
+
+    trigger_probability = 0.01
+    block_size = 1024  # number of waiting times drawn at once
+
+    def __init__(self, seed=None):
 
         api.reset()
         self.needs = list(needs.values())
@@ -33,61 +45,132 @@ class Simulation(object):
 
         self.current_simstep = 0
 
-        self.log = []
+        if seed is None:
+            seed = SystemRandom().randrange(2 ** 32)
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self._waiting_block = np.zeros(0, dtype=np.int64)  # the last block of waiting times that was drawn
+        self._waiting_times = []  # the rest of the block, reversed, so the next waiting time is popped from the end
+        # scheduled triggers as (step, index of consumption)
+        self.triggers = []
+        if self.trigger_probability > 0:
+            self.triggers = [(self._draw_waiting_time(), i) for i in range(len(self.consumptions))]
+        heapq.heapify(self.triggers)
+
+        self.log = DataLog(self)
+        self.player = None  # plays a script along with the simulation, see play()
+        self.arbiter = Arbiter() if Settings.arbitration else None  # chooses goals, see model.arbitration
+
+    def close(self):
+        """Releases the worker processes of the arbiter"""
+        if self.arbiter:
+            self.arbiter.close()
+
+    def play(self, schedule):
+        """Play a compiled script (see model.script_processor) from the current step on; entries scheduled for
+        the current step are executed with the next one"""
+        self.player = Player(schedule)
+        self.player.seek(self.current_simstep - 1)
+        return self.player
 
     def step(self):
         """Advances the simulation by a single step. Returns False if we are done"""
         if self.current_simstep < Settings.max_simulation_steps:
-            for consumption in self.consumptions:
-                if random()>0.99:
-                    consumption.trigger()
+            step = self.current_simstep + 1
+            triggers = self.triggers
+            while triggers and triggers[0][0] <= step:
+                _, index = heapq.heappop(triggers)
+                self.consumptions[index].trigger()
+                heapq.heappush(triggers, (step + self._draw_waiting_time(), index))
+            if self.player:
+                self.player.advance(step)
             api.update()
+            if self.arbiter:
+                self.arbiter.update(step)
             self.current_simstep += 1
             self._update_log()
             return True
         return False
 
+    def fast_forward(self, steps):
+        """Advances the simulation by the given number of steps. Periods without triggered consumptions in which
+        the agent is quiescent are skipped in a single jump; in this case, only the state at the end of the jump
+        is logged. Returns False if we are done"""
+        target = min(self.current_simstep + steps, Settings.max_simulation_steps)
+        while self.current_simstep < target:
+            next_trigger = self.next_trigger_step()
+            quiet_steps = (target if next_trigger is None else min(target, next_trigger - 1)) - self.current_simstep
+            skipped = api.fast_forward(quiet_steps)
+            if skipped:
+                self.current_simstep += skipped
+                self.log.record(self.current_simstep, force=True)
+            else:
+                self.step()
+        return self.current_simstep < Settings.max_simulation_steps
+
+    def snapshot(self):
+        """Returns the state of the agent and the simulation as bytes: the step, the random generator, the
+        scheduled triggers and the position in the script. The log is not part of the snapshot."""
+        player = [self.player.cursor, list(self.player.subtitles.items())] if self.player else None
+        triggers = array.array("q", [value for trigger in self.triggers for value in trigger])
+        waiting_times = self._waiting_block[len(self._waiting_block) - len(self._waiting_times):]
+        return checkpoint.to_bytes(checkpoint.get_state(),
+                                   [self.current_simstep, self.rng.bit_generator.state, player],
+                                   [waiting_times.tobytes(), triggers.tobytes()])
+
+    def restore(self, blob):
+        """Returns the agent and the simulation to the state of a snapshot; the script that is played must be
+        the same as when the snapshot was taken"""
+        state, data, sections = checkpoint.from_bytes(blob)
+        self.current_simstep, rng_state, player = data
+        waiting_times, triggers = sections
+        checkpoint.set_state(state)
+        self.rng.bit_generator.state = rng_state
+        self._waiting_block = np.frombuffer(waiting_times, dtype=np.int64)
+        self._waiting_times = self._waiting_block.tolist()[::-1]
+        triggers = array.array("q", triggers).tolist()
+        self.triggers = list(zip(triggers[::2], triggers[1::2]))
+        if player is not None and self.player:
+            cursor, subtitles = player
+            self.player.cursor, self.player.subtitles = cursor, dict(subtitles)
+
+    @contextlib.contextmanager
+    def fork(self, blob=None):
+        """Runs a what-if continuation of the simulation, from the current state or from a snapshot, with a log
+        of its own. Afterwards, the simulation returns to the state and the log it had before, e.g.
+
+            warm = simulation.snapshot()
+            for goal in candidates:
+                with simulation.fork(warm) as branch:
+                    api.set_goal(goal)
+                    branch.fast_forward(1000)
+                    results[goal] = branch.log.get("modulators", "valence")
+        """
+        before = self.snapshot()
+        log = self.log
+        if blob is not None:
+            self.restore(blob)
+        self.log = DataLog(self, log.capacity, log.decimation)
+        try:
+            yield self
+        finally:
+            self.log = log
+            self.restore(before)
+
+    def _draw_waiting_time(self):
+        """Number of steps until the next trigger of a consumption"""
+        if not self._waiting_times:
+            self._waiting_block = self.rng.geometric(self.trigger_probability, self.block_size).astype(np.int64)
+            self._waiting_times = self._waiting_block.tolist()[::-1]
+        return self._waiting_times.pop()
+
+    def next_trigger_step(self):
+        """Returns the next step in which a consumption will be triggered or the script does something"""
+        steps = [self.triggers[0][0]] if self.triggers else []
+        if self.player and self.player.next_step() is not None:
+            steps.append(self.player.next_step())
+        return min(steps) if steps else None
+
     def _update_log(self):
         """adds the current values to the log."""
-        self.log.append(api.get_data())
-
-
-class ValuePlot(Diagram):
-
-    key = "value"
-    window_title = "Values"
-
-    number_of_data_points = 50
-
-    def plot(self):
-        """overwrite this method to produce a different diagram type"""
-        self.data = self.simulation.log[-self.number_of_data_points:]
-        self.subplot.cla()
-        if len(self.data):
-            self.draw("needs", "food", "value", "blue")
-            self.draw("consumptions", "eat", "value", "green")
-            self.draw("consumptions", "success", "value", "red")
-
-    def draw(self, category, element, value, color = None):
-        t = [s[category][element][value] for s in self.data]
-        if color: self.subplot.plot(t, color = color, linewidth = 1.0)
-        else: self.subplot.plot(t, color = color, linewidth = 1.0)
-
-
-class ValueHistogram(Diagram):
-    """A modified PlotWindow to display an updateable histogram"""
-    key = "value distribution"
-    window_title = "Distribution of Values"
-
-    def plot(self):
-        data = self.simulation.log["needs"]["food"]["value"]
-        self.subplot.cla()
-        if len(data):
-            values = [entry for entry in data[-1]]
-            self.subplot.hist(values, bins=10, color="blue")
-
-
-
-diagrams = [ValuePlot, ValueHistogram]
-
-
+        self.log.record(self.current_simstep)
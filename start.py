@@ -22,6 +22,7 @@ def main():
     app.after_idle(app.call, 'wm', 'attributes', '.', '-topmost', False)
 
     app.mainloop()
+    app.shutdown()
 
 
 if __name__ == "__main__":
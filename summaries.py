@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""
+Summaries of the whole history of a run, for diagrams that cannot afford to look at every entry.
+
+Both classes are writers for the DataLog (see DataLog.add_writer): they receive every recorded entry, start with
+the entries that are still in the log, and keep their summaries for as long as the run lasts, independent of
+the capacity of the log.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import numpy as np
+
+
+class _Level(object):
+    """Minimum, maximum, sum and first step of the buckets of one level of a Pyramid, in growing arrays.
+    The buckets of a raw level hold a single entry each, so minimum, maximum and sum are the same array."""
+
+    def __init__(self, columns, capacity=64, raw=False):
+        self.raw = raw
+        self.min = np.zeros((columns, capacity))
+        self.max = self.min if raw else np.zeros((columns, capacity))
+        self.sum = self.min if raw else np.zeros((columns, capacity))
+        self.step = np.zeros(capacity, dtype=np.int64)
+        self.count = 0
+
+    def append(self, step, minimum, maximum, total):
+        if self.count == len(self.step):
+            for attribute in ("min", "step") if self.raw else ("min", "max", "sum", "step"):
+                array = getattr(self, attribute)
+                setattr(self, attribute, np.concatenate((array, np.zeros_like(array)), axis=-1))
+            if self.raw:
+                self.max = self.sum = self.min
+        i = self.count
+        self.min[:, i] = minimum
+        if not self.raw:
+            self.max[:, i] = maximum
+            self.sum[:, i] = total
+        self.step[i] = step
+        self.count += 1
+
+
+class Pyramid(object):
+    """Minimum, maximum and mean of some columns of the log, at every power-of-two resolution: a bucket of level k
+    summarizes 2**k consecutive entries. A new entry goes into level 0, and whenever a level completes a pair of
+    buckets, they are merged into a bucket of the next level, so recording takes amortized constant time.
+    Level 0 holds the raw values once, and the levels above hold minimum, maximum and sum of half as many buckets
+    each, so the pyramid needs about four times the memory of the raw values of its columns (plus the steps),
+    and grows linearly with the length of the run.
+    get() returns the history between two entries with a bounded number of buckets, whatever its length."""
+
+    def __init__(self, log, columns):
+        self.columns = [tuple(column) for column in columns]
+        self.index = {column: i for i, column in enumerate(self.columns)}
+        self.sources = [log.index[column] for column in self.columns]
+        self.levels = [_Level(len(self.columns), raw=True)]
+        self.count = 0  # number of entries
+        for start in range(0, len(log), 4096):
+            steps, values = log.get_block(start, start + 4096)
+            for j, step in enumerate(steps):
+                self._add(step, values[self.sources, j])
+
+    def append(self, step, values):
+        self._add(step, np.array([values[i] for i in self.sources], dtype=float))
+
+    def _add(self, step, values):
+        self.levels[0].append(step, values, values, values)
+        self.count += 1
+        k = 0
+        while self.levels[k].count % 2 == 0:  # a pair is complete, merge it into the next level
+            level = self.levels[k]
+            if k + 1 == len(self.levels):
+                self.levels.append(_Level(len(self.columns)))
+            i = level.count - 2
+            self.levels[k + 1].append(level.step[i],
+                                      np.minimum(level.min[:, i], level.min[:, i + 1]),
+                                      np.maximum(level.max[:, i], level.max[:, i + 1]),
+                                      level.sum[:, i] + level.sum[:, i + 1])
+            k += 1
+
+    def __len__(self):
+        return self.count
+
+    def _merge(self, c, start, stop):
+        """Returns the first step, minimum, maximum and mean of column c over the entries from start to stop,
+        merged from the fewest complete buckets that cover exactly this range"""
+        pieces = []
+        position = start
+        while position < stop:
+            j = 0  # the largest bucket that starts at the position and ends before stop
+            while (j + 1 < len(self.levels) and position % (2 << j) == 0 and position + (2 << j) <= stop and
+                   (position >> (j + 1)) < self.levels[j + 1].count):
+                j += 1
+            pieces.append((self.levels[j], position >> j))
+            position += 1 << j
+        return (pieces[0][0].step[pieces[0][1]],
+                min(level.min[c, i] for level, i in pieces),
+                max(level.max[c, i] for level, i in pieces),
+                sum(level.sum[c, i] for level, i in pieces) / (stop - start))
+
+    def get(self, column, buckets=1000, start=0, stop=None):
+        """Returns the first steps, minima, maxima and means of at most about the given number of buckets, which
+        cover exactly the entries from start to stop (counted from the first entry) of a column. The buckets are
+        aligned to the buckets of the pyramid; the first and the last one may be partial, and then summarize
+        only the entries of the range."""
+        stop = self.count if stop is None else min(stop, self.count)
+        start = max(0, start)
+        c = self.index[tuple(column)]
+        if start >= stop:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), np.zeros(0)
+        k = 0
+        while k + 1 < len(self.levels) and (stop - start) >> k > buckets:
+            k += 1
+        level = self.levels[k]
+        size = 1 << k
+        first, last = -(-start // size), stop >> k  # the complete buckets of level k within the range
+        if first >= last:
+            head, tail = [self._merge(c, start, stop)], []
+            first = last = 0
+        else:
+            head = [self._merge(c, start, first * size)] if start < first * size else []
+            tail = [self._merge(c, last * size, stop)] if last * size < stop else []
+        steps = np.concatenate(([p[0] for p in head], level.step[first:last], [p[0] for p in tail]))
+        minimum = np.concatenate(([p[1] for p in head], level.min[c, first:last], [p[1] for p in tail]))
+        maximum = np.concatenate(([p[2] for p in head], level.max[c, first:last], [p[2] for p in tail]))
+        mean = np.concatenate(([p[3] for p in head], level.sum[c, first:last] / size, [p[3] for p in tail]))
+        return steps.astype(np.int64), minimum, maximum, mean
+
+
+class StreamingHistogram(object):
+    """Counts the values of a column of the log in fixed bins, over the whole history.
+    Values outside of the range of the bins are counted in the first and the last bin."""
+
+    def __init__(self, log, column, bins=10, range=(0.0, 1.0)):
+        self.column = tuple(column)
+        self.source = log.index[self.column]
+        self.edges = np.linspace(range[0], range[1], bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.scale = bins / (range[1] - range[0])
+        self.low = range[0]
+        self.counts += np.bincount(self._bins(log.get(*self.column)), minlength=bins)
+
+    def _bins(self, values):
+        return np.clip(((np.asarray(values) - self.low) * self.scale).astype(int), 0, len(self.counts) - 1)
+
+    def append(self, step, values):
+        i = int((values[self.source] - self.low) * self.scale)
+        self.counts[min(len(self.counts) - 1, max(0, i))] += 1
+
+    def __len__(self):
+        return int(self.counts.sum())
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+"""
+Parameter sweeps over the needs, consumptions and modulators of the agent, e.g.
+
+    python -m sweep --param needs.water.weight=0.5:2 --param modulators.arousal.baseline=0:0.6 \\
+                    --design lhs --samples 32 --steps 20000 --workers 8 --output sweep.csv
+
+Parameters are named category.element.attribute. For grids, give a comma separated list of values,
+for random and Latin hypercube designs an interval low:high. Every configuration runs in a worker process,
+and the summary statistics of all runs are collected into a single table. The statistics are accumulated while
+a run goes on, so the memory of a worker does not grow with the number of steps.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import argparse
+import csv
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from configuration import APPTITLE
+from datalog import DataLog
+from simulation import Simulation
+from model import needs, modulators
+
+categories = {"needs": needs.needs, "consumptions": needs.consumptions, "modulators": modulators.modulators}
+aliases = {"reward": "default_reward", "duration": "default_duration"}  # consumption attributes
+
+depletion_threshold = 0.05  # below this value, a need is depleted and creates pain
+
+
+def _resolve(parameter):
+    """Returns the element and the attribute for a parameter name like needs.water.weight"""
+    category, element, attribute = parameter.split(".")
+    element = categories[category][element]
+    attribute = aliases.get(attribute, attribute)
+    if not hasattr(element, attribute):
+        raise KeyError("unknown parameter: %s" % parameter)
+    return element, attribute
+
+
+def apply(configuration):
+    """Sets the parameters of a configuration and returns the previous values"""
+    previous = {}
+    for parameter, value in configuration.items():
+        element, attribute = _resolve(parameter)
+        previous[parameter] = getattr(element, attribute)
+        setattr(element, attribute, value)
+    return previous
+
+
+def grid(space):
+    """All combinations of the values of every parameter; space maps parameter names to lists of values"""
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*[space[name] for name in names])]
+
+
+def random_design(space, samples, seed=None):
+    """Uniformly distributed configurations; space maps parameter names to (low, high)"""
+    rng = np.random.default_rng(seed)
+    names = sorted(space)
+    return [{name: float(rng.uniform(*space[name])) for name in names} for _ in range(samples)]
+
+
+def latin_hypercube(space, samples, seed=None):
+    """Configurations that cover each parameter interval in as many strata as there are samples"""
+    rng = np.random.default_rng(seed)
+    names = sorted(space)
+    columns = {}
+    for name in names:
+        low, high = space[name]
+        strata = (rng.permutation(samples) + rng.random(samples)) / samples
+        columns[name] = low + strata * (high - low)
+    return [{name: float(columns[name][i]) for name in names} for i in range(samples)]
+
+
+class Summary(object):
+    """Accumulates the summary statistics of a run from the entries of its log; attach it with
+    DataLog.add_writer()"""
+
+    def __init__(self, log, simulation):
+        self.emotion_names = [e.name for e in simulation.emotions if ("emotions", e.name, "value") in log.index]
+        self.modulator_names = [m.name for m in simulation.modulators]
+        self.need_names = [n.name for n in simulation.needs]
+        self.emotion_columns = [log.index[("emotions", name, "value")] for name in self.emotion_names]
+        self.modulator_columns = [log.index[("modulators", name, "value")] for name in self.modulator_names]
+        self.need_columns = [log.index[("needs", name, "value")] for name in self.need_names]
+
+        self.count = 0
+        self.emotion_sums = np.zeros(len(self.emotion_names))
+        self.dominant = np.zeros(len(self.emotion_names), dtype=np.int64)  # entries in which an emotion dominates
+        self.no_emotion = 0  # entries without any positive emotion
+        self.modulator_sums = np.zeros(len(self.modulator_names))
+        self.depleted = np.zeros(len(self.need_names), dtype=bool)  # in the last entry
+        self.depletions = np.zeros(len(self.need_names), dtype=np.int64)
+
+    def append(self, step, values):
+        values = np.asarray(values, dtype=float)
+        self.count += 1
+        emotion_values = values[self.emotion_columns]
+        self.emotion_sums += emotion_values
+        if len(emotion_values) and emotion_values.max() > 0:
+            self.dominant[np.argmax(emotion_values)] += 1
+        else:
+            self.no_emotion += 1
+        self.modulator_sums += values[self.modulator_columns]
+        depleted = values[self.need_columns] < depletion_threshold
+        self.depletions += depleted & ~self.depleted
+        self.depleted = depleted
+
+
+def summarize(summary, simulation):
+    """Summary statistics of a finished run"""
+    result = {"steps": simulation.current_simstep}
+    count = max(1, summary.count)
+    for i, name in enumerate(summary.emotion_names):
+        result["emotion.%s.mean" % name] = float(summary.emotion_sums[i] / count)
+        result["emotion.%s.dominant" % name] = float(summary.dominant[i] / count)
+    result["emotion.none.dominant"] = float(summary.no_emotion / count)
+
+    for i, name in enumerate(summary.modulator_names):
+        result["modulator.%s.mean" % name] = float(summary.modulator_sums[i] / count)
+
+    for i, name in enumerate(summary.need_names):
+        result["need.%s.depletions" % name] = int(summary.depletions[i])
+    result["need.depletions"] = int(summary.depletions.sum())
+    return result
+
+
+def run_configuration(task):
+    """Runs a single configuration; this is the function that is executed by the worker processes"""
+    configuration, steps, seed = task
+    previous = apply(configuration)
+    try:
+        simulation = Simulation(seed)
+        simulation.log = DataLog(simulation, capacity=1, decimation=1)  # the summary gets every entry
+        summary = Summary(simulation.log, simulation)
+        simulation.log.add_writer(summary)
+        for _ in range(steps):
+            if not simulation.step():
+                break
+        result = dict(configuration, seed=seed)
+        result.update(summarize(summary, simulation))
+        return result
+    finally:
+        apply(previous)
+
+
+def run_sweep(configurations, steps, seeds=(0,), workers=None):
+    """Runs every configuration with every seed, using a pool of worker processes (or none, if workers is 1).
+    Returns a list of result rows, in the order of the configurations."""
+    tasks = [(configuration, steps, seed) for configuration in configurations for seed in seeds]
+    if workers == 1:
+        return [run_configuration(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_configuration, tasks))
+
+
+def write_table(results, path):
+    """Writes the result rows into a CSV file"""
+    fields = []
+    for row in results:
+        fields.extend(key for key in row if key not in fields)
+    with open(path, "w", newline="") as table:
+        writer = csv.DictWriter(table, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def _parse_space(parameters, design):
+    space = {}
+    for parameter in parameters:
+        name, _, values = parameter.partition("=")
+        _resolve(name)
+        if design == "grid":
+            space[name] = [float(value) for value in values.split(",")]
+        else:
+            low, high = values.split(":")
+            space[name] = (float(low), float(high))
+    return space
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep for the %s." % APPTITLE)
+    parser.add_argument("--param", action="append", default=[], dest="parameters", metavar="NAME=VALUES",
+                        help="parameter and its values, e.g. needs.food.weight=0.2,0.6 or needs.food.weight=0.2:1")
+    parser.add_argument("--design", choices=("grid", "random", "lhs"), default="grid")
+    parser.add_argument("--samples", type=int, default=16, help="number of configurations for random and lhs")
+    parser.add_argument("--steps", type=int, default=1000, help="simulation steps per run")
+    parser.add_argument("--seeds", type=int, default=1, help="number of seeds per configuration")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random designs and the first run")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--output", default="sweep.csv", help="CSV file for the result table")
+    args = parser.parse_args(args)
+
+    try:
+        space = _parse_space(args.parameters, args.design)
+    except (KeyError, ValueError) as error:
+        parser.error(str(error))
+
+    if args.design == "grid":
+        configurations = grid(space)
+    elif args.design == "random":
+        configurations = random_design(space, args.samples, args.seed)
+    else:
+        configurations = latin_hypercube(space, args.samples, args.seed)
+
+    seeds = range(args.seed, args.seed + args.seeds)
+    results = run_sweep(configurations, args.steps, seeds, args.workers)
+    write_table(results, args.output)
+    print("%d runs written to %s" % (len(results), args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from configuration import Settings
+from model import api, arbitration, checkpoint, events, goals
+from simulation import Simulation
+
+
+@pytest.fixture
+def simulation():
+    simulation = Simulation(5)
+    for _ in range(200):
+        simulation.step()
+    return simulation
+
+
+def test_pursuit_is_reached_within_the_rollout():
+    horizon = Settings.arbitration_horizon
+    assert arbitration.pursuit_steps(horizon) < horizon
+    assert arbitration.pursuit_steps(horizon, pursuit=2.0) < horizon
+    assert arbitration.pursuit_steps(horizon, pursuit=1e6) == horizon - 1
+    assert arbitration.pursuit_steps(10, pursuit=0.04) == 1
+
+
+@pytest.mark.parametrize("expected_reward", [0.8, -0.8])
+def test_rollout_reaches_the_goal(simulation, monkeypatch, expected_reward):
+    api.create_event("candidate", "eat", expected_reward, certainty=0.9, skill=0.8, expiration=-1)
+    executed, removed = [], []
+    execute_event, remove_event = events.execute_event, events.remove_event
+    monkeypatch.setattr(events, "execute_event", lambda id, *args: executed.append(id) or execute_event(id, *args))
+    monkeypatch.setattr(events, "remove_event", lambda id: removed.append(id) or remove_event(id))
+
+    state = checkpoint.get_state()
+    baseline = arbitration.rollout(None)
+    assert "candidate" in events.events
+    checkpoint.set_state(state, notify=False)
+    score = arbitration.rollout("candidate")
+    assert "candidate" not in events.events
+    assert (executed if expected_reward > 0 else removed) == ["candidate"]
+    assert score != pytest.approx(baseline, abs=1e-6)
+
+
+def test_evaluate_keeps_the_state(simulation):
+    api.create_event("lunch", "eat", 0.8, 0.9, 0.8, 3)
+    api.create_event("snake", "bruise", -0.6, 0.7, 0.6, -1)
+    before = api.get_data()
+    notified = []
+    goals.add_listener(notified.append)
+    try:
+        scores = arbitration.Arbiter(budget=10.0).evaluate()
+    finally:
+        goals.remove_listener(notified.append)
+    assert set(scores) == {None, "lunch", "snake"}
+    assert api.get_data() == before
+    assert notified == []
+
+
+def test_evaluate_stays_within_the_budget(simulation):
+    for i in range(20):
+        api.create_event("event_%d" % i, "eat", 0.5, 0.5, 0.5, -1)
+    start = time.perf_counter()
+    arbitration.Arbiter(budget=0.005).evaluate()
+    assert time.perf_counter() - start < 0.05
+
+
+def test_pool_collects_rollouts_across_ticks(simulation):
+    api.create_event("lunch", "eat", 0.8, 0.9, 0.8, -1)
+    expected = arbitration.Arbiter(budget=10.0).evaluate()
+    with arbitration.Arbiter(budget=1e-9, workers=1, interval=1000) as arbiter:
+        arbiter.update(0)
+        assert arbiter.batch is not None
+        for step in range(1, 1000):
+            time.sleep(0.01)
+            arbiter.update(step)
+            if arbiter.batch is None:
+                break
+        assert arbiter.batch is None
+        assert arbiter.pool is not None
+    assert arbiter.scores == pytest.approx(expected)
+
+
+def test_pool_discards_a_choice_whose_candidates_are_gone(simulation):
+    api.create_event("lunch", "eat", 0.8, 0.9, 0.8, -1)
+    api.create_event("snack", "eat", 0.3, 0.9, 0.8, -1)
+    with arbitration.Arbiter(budget=1e-9, workers=1, interval=1000) as arbiter:
+        arbiter.update(0)
+        assert arbiter.batch is not None
+        events.remove_event("lunch")
+        arbiter.update(1)
+        assert arbiter.batch is None
+        assert arbiter.scores == {}
+
+
+def fail(*args):
+    raise ValueError("snapshot does not fit")
+
+
+def test_pool_falls_back_to_the_process_if_a_worker_fails(simulation, monkeypatch):
+    api.create_event("lunch", "eat", 0.8, 0.9, 0.8, -1)
+    monkeypatch.setattr(arbitration, "_evaluate", fail)  # inherited by forked workers, or found by name
+    with arbitration.Arbiter(budget=10.0, workers=1) as arbiter:
+        with pytest.warns(UserWarning):
+            scores = arbiter.evaluate()
+        assert arbiter.pool is None
+    assert set(scores) == {None, "lunch"}
+
+
+def test_simulation_chooses_goals_when_arbitration_is_on(monkeypatch):
+    monkeypatch.setattr(Settings, "arbitration", True)
+    monkeypatch.setattr(Settings, "arbitration_budget", 10.0)
+    simulation = Simulation(5)
+    try:
+        assert simulation.arbiter is not None
+        api.create_event("lunch", "eat", 0.8, 0.9, 0.8, -1)
+        for _ in range(simulation.arbiter.interval):
+            simulation.step()
+        assert set(simulation.arbiter.scores) == {None, "lunch"}
+    finally:
+        simulation.close()
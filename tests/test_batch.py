@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import batch
+from configuration import Settings
+from model import transcripts
+
+
+def test_batch_plays_a_script(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcripts, "cache_directory", str(tmp_path / "cache"))
+    script = tmp_path / "script.jsonl"
+    script.write_text('{"t": %d, "x": "create_event(\\"lunch\\", \\"eat\\", 0.8, 0.9, 0.8, 50)"}\n'
+                      '{"t": %d, "x": "set_goal(\\"lunch\\")"}\n'
+                      % (1000 + 3 * Settings.update_milliseconds, 1000 + 5 * Settings.update_milliseconds))
+    output = tmp_path / "results"
+    batch.main(["--steps", "10", "--output", str(output), "--format", "jsonl",
+                "--script", str(script), "--script-origin", "1000"])
+    with open(output / "seed_0.json") as summary_file:
+        summary = json.load(summary_file)
+    assert [(event["id"], event["is_goal"]) for event in summary["final_state"]["events"]] == [("lunch", True)]
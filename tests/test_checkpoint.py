@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+
+import pytest
+
+from model import api, checkpoint, emotions, needs
+from simulation import Simulation
+
+
+def test_restore_continues_like_the_original_run():
+    simulation = Simulation(11)
+    for _ in range(300):
+        simulation.step()
+    api.create_event("lunch", "eat", 0.8, 0.9, 0.8, 3)
+    blob = simulation.snapshot()
+    for _ in range(500):
+        simulation.step()
+    expected = api.get_data()
+
+    simulation.restore(blob)
+    for _ in range(500):
+        simulation.step()
+    assert api.get_data() == expected
+
+
+def test_pickles_are_not_loaded():
+    blob = pickle.dumps(checkpoint.get_state())
+    with pytest.raises(ValueError):
+        checkpoint.restore(blob)
+
+
+def test_restore_keeps_the_reward_queues_and_the_inputs_of_the_emotions():
+    simulation = Simulation(2)
+    for step in range(60):
+        api.consume("eat")
+        needs.consumptions["mate"].trigger(0.01 * step, 2.0 + step % 3)
+        simulation.step()
+    emotions.emotions["joy"].input_values = None
+    rewards = {c.name: sorted(c.active_rewards) for c in needs.consumptions.values()}
+    inputs = {e.name: e.input_values for e in emotions.emotions.values()}
+    durations = {c.name: set(c.reward_queues) for c in needs.consumptions.values()}
+    blob = simulation.snapshot()
+    for _ in range(100):
+        simulation.step()
+
+    simulation.restore(blob)
+    assert {c.name: sorted(c.active_rewards) for c in needs.consumptions.values()} == rewards
+    assert {e.name: e.input_values for e in emotions.emotions.values()} == inputs
+    assert {c.name: set(c.reward_queues) for c in needs.consumptions.values()} == durations
+    assert {2.0, 3.0, 4.0} <= durations["mate"]
+
+
+def test_truncated_snapshots_are_rejected():
+    blob = Simulation(0).snapshot()
+    with pytest.raises(ValueError):
+        checkpoint.restore(blob[:-8])
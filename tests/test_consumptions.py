@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+from model import needs
+from model.common import calculate_signal_strength, get_signal_length
+from model.population import Agent
+
+
+def test_stacked_rewards_match_the_signal_strengths():
+    rng = random.Random(1)
+    with Agent():
+        consumption = needs.consumptions["mate"]
+        consumption.active_rewards = []
+        expected_rewards = []
+        for step in range(3000):
+            if rng.random() < 0.05:
+                reward, duration = rng.uniform(-0.2, 0.2), rng.choice([0.04, 2.0, 3.5, 120.0, 1e6])
+                consumption.trigger(reward, duration)
+                expected_rewards.append((0, reward, duration))
+            if step == 1500:
+                consumption.active_rewards = consumption.active_rewards
+                assert sorted(consumption.active_rewards) == sorted(expected_rewards)
+
+            expected = sum(reward * calculate_signal_strength(s, 1.0, duration)
+                           for s, reward, duration in expected_rewards)
+            expected_rewards = [(s + 1, reward, duration) for s, reward, duration in expected_rewards
+                                if s + 1 < get_signal_length(duration)]
+            consumption.update()
+            expected = min(consumption.max_reward, max(-consumption.max_reward, expected))
+            assert consumption.value == pytest.approx(expected, abs=1e-12)
+        assert consumption.count_rewards() == len(expected_rewards)
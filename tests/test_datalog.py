@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+
+import numpy as np
+import pytest
+
+import datalog
+from datalog import DataLog
+from model import api
+from simulation import Simulation
+
+
+@pytest.fixture
+def simulation():
+    simulation = Simulation(4)
+    simulation.log = DataLog(simulation, capacity=50)
+    return simulation
+
+
+def run(simulation, steps):
+    """Steps the simulation, and returns the values of the food need in every step"""
+    values = []
+    for _ in range(steps):
+        simulation.step()
+        values.append(simulation.need_index["food"].value)
+    return values
+
+
+def test_log_keeps_the_most_recent_window(simulation):
+    values = run(simulation, 137)
+    log = simulation.log
+    assert log.count == 137
+    assert len(log) == log.capacity == 50
+    assert log.dropped() == 87
+    assert np.array_equal(log.get_steps(), np.arange(88, 138))
+    assert np.array_equal(log.get("needs", "food"), values[-50:])
+    assert np.array_equal(log.get("needs", "food", last=10), values[-10:])
+    assert log.get_entry(0)["step"] == 88
+    assert log.get_entry(-1)["needs"]["food"]["value"] == values[-1]
+    assert [row[0] for row in log.rows(chunk_size=7)] == list(range(88, 138))
+
+
+def test_log_before_wraparound(simulation):
+    values = run(simulation, 20)
+    assert len(simulation.log) == simulation.log.count == 20
+    assert simulation.log.dropped() == 0
+    assert np.array_equal(simulation.log.get("needs", "food"), values)
+
+
+def test_json_lines_export(simulation):
+    run(simulation, 80)
+    output = io.StringIO()
+    datalog.write_json_lines(simulation.log, output)
+    lines = output.getvalue().splitlines()
+    header = json.loads(lines[0])
+    assert header["format"] == datalog.JSON_FORMAT
+    assert header["seed"] == 4
+    assert header["dropped_entries"] == 30
+    rows = [json.loads(line) for line in lines[1:]]
+    assert [row[0] for row in rows] == list(range(31, 81))
+    assert api.rehydrate(rows[-1][1:], header["schema"], rows[-1][0], static=False) == simulation.log.get_entry(-1)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from model import api, emotions, modulators
+from simulation import Simulation
+
+
+@pytest.fixture(autouse=True)
+def restore_settings(monkeypatch):
+    monkeypatch.setattr(emotions, "epsilon", None)
+    yield
+    emotions.observe(None)
+
+
+def run(seed, steps):
+    """Steps a simulation and returns the values of the emotions after every step"""
+    simulation = Simulation(seed)
+    api.create_event("lunch", "eat", 0.8, 0.9, 0.8, 40)
+    api.create_event("fight", "bruise", -0.2, 0.7, 0.5, 150)
+    history = []
+    for step in range(steps):
+        if step % 50 == 10:
+            api.consume("eat")
+            api.consume("success")
+        simulation.step()
+        history.append({name: emotion.value for name, emotion in emotions.emotions.items()})
+    return history
+
+
+def from_scratch(emotion):
+    return emotion.calculate(*(emotions.get_input(source) for source in emotion.inputs))
+
+
+def set_modulators(valence, arousal):
+    modulators.modulators["valence"].value = valence
+    modulators.modulators["arousal"].value = arousal
+
+
+def test_zero_epsilon_matches_full_recomputation():
+    expected = run(5, 300)
+    emotions.epsilon = 0
+    assert run(5, 300) == expected
+    for emotion in emotions.emotions.values():
+        assert emotion.value == from_scratch(emotion), emotion.name
+
+
+def test_unobserved_emotions_are_not_computed():
+    Simulation(0)
+    api.observe_emotions(["joy", "fear"])
+    for emotion in emotions.emotions.values():
+        emotion.value = -7
+    set_modulators(0.5, 0.4)
+    emotions.update()
+    for name, emotion in emotions.emotions.items():
+        if name in ("joy", "fear"):
+            assert emotion.value == from_scratch(emotion), name
+        else:
+            assert emotion.value == -7, name
+    input_readers, entries = emotions.get_plan()
+    assert [emotion.name for emotion, pick in entries] == ["joy", "fear"]
+    assert len(input_readers) == 3  # valence, arousal and the anticipated aversion
+
+
+def test_inputs_that_move_by_more_than_epsilon_trigger_a_recomputation():
+    Simulation(0)
+    emotions.epsilon = 0.01
+    set_modulators(0.5, 0.4)
+    emotions.update()
+    joy = emotions.emotions["joy"]
+    assert joy.value == pytest.approx(0.2)
+
+    set_modulators(0.505, 0.4)  # within epsilon: joy keeps its value
+    emotions.update()
+    assert joy.value == pytest.approx(0.2)
+
+    set_modulators(0.505, 0.42)  # one input moved by more than epsilon
+    emotions.update()
+    assert joy.value == pytest.approx(0.505 * 0.42)
+    assert joy.input_values == (0.505, 0.42)
+
+
+def test_joy_is_positive_valence_times_arousal():
+    Simulation(0)
+    set_modulators(0.6, 0.5)
+    emotions.update()
+    assert emotions.emotions["joy"].value == pytest.approx(0.3)
+    set_modulators(-0.6, 0.5)
+    emotions.update()
+    assert emotions.emotions["joy"].value == 0
+    assert emotions.emotions["anger"].value == pytest.approx(0.3)
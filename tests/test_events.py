@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from configuration import Settings
+from model import api, events, goals, modulators
+from simulation import Simulation
+
+
+@pytest.fixture(autouse=True)
+def simulation():
+    return Simulation(0)
+
+
+def ids():
+    return [event.id for event in events.events.ordered()]
+
+
+def sums_from_scratch():
+    """The sums of anticipation_sums, computed without the cache"""
+    events.events.changed()
+    return events.events.anticipation_sums()
+
+
+def test_order_follows_additions_removals_and_changes():
+    api.create_event("later", "eat", 0.5, 0.5, 0.5, 10)
+    api.create_event("sooner", "drink", 0.5, 0.5, 0.5, 2)
+    api.create_event("never", "bruise", -0.5, 0.5, 0.5, -1)
+    assert ids() == ["never", "sooner", "later"]
+
+    api.create_event("soonest", "eat", 0.5, 0.5, 0.5, 1)
+    assert ids() == ["never", "soonest", "sooner", "later"]
+
+    events.change_event("later", expiration=0.5)
+    assert ids() == ["never", "later", "soonest", "sooner"]
+
+    events.remove_event("soonest")
+    assert ids() == ["never", "later", "sooner"]
+
+    for _ in range(int(round(0.5 * 1000 / Settings.update_milliseconds)) + 2):
+        events.update()
+    assert ids() == ["never", "sooner"]
+    assert events.events["sooner"].expiration == pytest.approx(2 - 0.04 * 14, abs=1e-9)
+
+
+def test_expired_events_are_removed_in_update():
+    # several events expire in the same tick, one of them the goal
+    for i in range(6):
+        api.create_event("event_%d" % i, "eat", 0.5, 0.5, 0.5, Settings.update_milliseconds / 1000 * (i // 2 + 1))
+    api.set_goal("event_1")
+    events.update()
+    assert sorted(events.events) == ["event_2", "event_3", "event_4", "event_5"]
+    assert goals.goal is None
+    events.update()
+    events.update()
+    assert len(events.events) == 0
+
+
+def test_anticipation_sums_follow_focus_and_goal():
+    api.create_event("lunch", "eat", 0.8, 0.9, 0.8, 3)
+    api.create_event("snake", "bruise", -0.6, 0.7, 0.6, 5)
+    without_goal = events.events.anticipation_sums()
+    assert without_goal == sums_from_scratch()
+
+    api.set_goal("lunch")
+    with_goal = events.events.anticipation_sums()
+    assert with_goal == sums_from_scratch()
+    focus = modulators.modulators["focus"].value
+    assert with_goal[0] == pytest.approx(without_goal[0] * (1 + focus))
+
+    modulators.modulators["focus"].value = focus + 0.25
+    assert events.events.anticipation_sums()[0] == pytest.approx(without_goal[0] * (1 + focus + 0.25))
+    assert events.events.anticipation_sums() == sums_from_scratch()
+
+    events.update()  # expirations change, so the discounted rewards change
+    assert events.events.anticipation_sums() == sums_from_scratch()
+    assert events.events.anticipation_sums() != with_goal
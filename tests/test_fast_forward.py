@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from model import api
+from simulation import Simulation
+
+
+def run(steps, fast_forward):
+    simulation = Simulation(3)
+    if fast_forward:
+        simulation.fast_forward(steps)
+    else:
+        for _ in range(steps):
+            simulation.step()
+    return api.get_data()
+
+
+@pytest.mark.parametrize("trigger_probability", [0, 0.001])
+def test_fast_forward_matches_stepping(monkeypatch, trigger_probability):
+    monkeypatch.setattr(Simulation, "trigger_probability", trigger_probability)
+    stepped = run(3000, fast_forward=False)
+    jumped = run(3000, fast_forward=True)
+    assert jumped["step"] == stepped["step"]
+    for category in ("needs", "consumptions", "modulators", "aggregates", "emotions"):
+        for name, element in stepped[category].items():
+            for field, value in element.items():
+                if isinstance(value, float):
+                    assert jumped[category][name][field] == pytest.approx(value, abs=1e-10), (category, name, field)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+pytest.importorskip("matplotlib")
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import plots
+from simulation import Simulation
+
+
+@pytest.fixture
+def simulation():
+    simulation = Simulation(11)
+    for _ in range(300):
+        simulation.step()
+    return simulation
+
+
+def open_diagram(Diagram, simulation):
+    """A diagram on an Agg canvas, without its window"""
+    diagram = Diagram.__new__(Diagram)
+    diagram.setup_figure(simulation, FigureCanvasAgg(Figure(figsize=(5, 4), dpi=100)))
+    diagram.draws = []
+    diagram.canvas.mpl_connect("draw_event", diagram.draws.append)
+    diagram.draw_sample(diagram.sample())
+    return diagram
+
+
+def image(diagram):
+    return np.array(diagram.canvas.buffer_rgba())
+
+
+def assert_blitted_like_a_full_redraw(diagram):
+    blitted = image(diagram)
+    diagram.canvas.draw()
+    assert np.array_equal(blitted, image(diagram))
+
+
+@pytest.mark.parametrize("Diagram", plots.diagrams)
+def test_diagram_is_blitted(simulation, Diagram):
+    diagram = open_diagram(Diagram, simulation)
+    assert len(diagram.draws) == 1 and diagram.background is not None
+    before = image(diagram)
+    for _ in range(20):
+        for _ in range(5):
+            simulation.step()
+        diagram.draw_sample(diagram.sample())
+    assert len(diagram.draws) < 5  # only when the limits grow
+    assert not np.array_equal(before, image(diagram))
+    assert_blitted_like_a_full_redraw(diagram)
+
+
+@pytest.mark.parametrize("Diagram", plots.diagrams)
+def test_changed_limits_redraw_the_background(simulation, Diagram):
+    diagram = open_diagram(Diagram, simulation)
+    background = diagram.background
+    diagram.subplot.set_xlim(0, 1)  # too small for every diagram, so plot() has to grow an axis
+    diagram.subplot.set_ylim(0, 1e-3)
+    diagram.draw_sample(diagram.sample())
+    assert len(diagram.draws) == 2
+    assert diagram.background is not background
+    simulation.step()
+    diagram.draw_sample(diagram.sample())
+    assert_blitted_like_a_full_redraw(diagram)
+
+
+@pytest.mark.parametrize("Diagram", plots.diagrams)
+def test_resize_redraws_the_background(simulation, Diagram):
+    diagram = open_diagram(Diagram, simulation)
+    diagram.canvas.figure.set_size_inches(7, 3)
+    simulation.step()
+    diagram.draw_sample(diagram.sample())
+    assert len(diagram.draws) == 2
+    assert image(diagram).shape[:2] == (300, 700)
+    assert_blitted_like_a_full_redraw(diagram)
+
+
+@pytest.mark.parametrize("Diagram", plots.diagrams)
+def test_close_and_reopen(simulation, Diagram):
+    writers = list(simulation.log.writers)
+    diagram = open_diagram(Diagram, simulation)
+    diagram.detach()
+    assert simulation.log.writers == writers
+    for _ in range(50):
+        simulation.step()
+    diagram = open_diagram(Diagram, simulation)
+    assert len(simulation.log.writers) == len(writers) + len(diagram.writers)
+    for _ in range(50):
+        simulation.step()
+    diagram.draw_sample(diagram.sample())
+    assert_blitted_like_a_full_redraw(diagram)
+    diagram.detach()
+    assert simulation.log.writers == writers
+
+
+def test_summaries_follow_the_log(simulation):
+    history = open_diagram(plots.HistoryPlot, simulation)
+    histogram = open_diagram(plots.ValueHistogram, simulation)
+    for _ in range(100):
+        simulation.step()
+    steps, minimum, maximum, mean = history.sample()
+    values = simulation.log.get(*history.column)
+    assert steps[0] == simulation.log.get_steps()[0]
+    assert minimum.min() == values.min() and maximum.max() == values.max()
+    assert histogram.sample().sum() == len(simulation.log)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from model import api, needs, modulators, emotions
+from model.population import Agent, Population, emotion_formulas
+from simulation import Simulation
+
+
+def test_formulas_cover_all_emotions():
+    assert set(emotion_formulas) == set(emotions.emotions)
+
+
+def test_population_matches_single_agents():
+    Simulation(0)  # reset the agent in the registries, which is the prototype
+    size = 4
+    population = Population(size)
+    agents = [Agent(prototype=population.prototype) for _ in range(size)]
+    consumption_names = list(needs.consumptions)
+    rng = np.random.default_rng(8)
+
+    for step in range(300):
+        hits = rng.random((size, len(consumption_names))) < 0.02
+        for i, agent in enumerate(agents):
+            with agent:
+                for j in np.flatnonzero(hits[i]):
+                    needs.consumptions[consumption_names[j]].trigger()
+                api.update()
+        for j, name in enumerate(consumption_names):
+            if hits[:, j].any():
+                population.trigger(name, agents=np.flatnonzero(hits[:, j]))
+        population.update()
+
+    for i, agent in enumerate(agents):
+        with agent:
+            for name, need in needs.needs.items():
+                for field in ("value", "pleasure", "pain", "urge", "urgency"):
+                    assert population.get_need(name, field)[i] == pytest.approx(getattr(need, field), abs=1e-12)
+            for name, modulator in modulators.modulators.items():
+                assert population.get_modulator(name)[i] == pytest.approx(modulator.value, abs=1e-12), name
+            for name, aggregate in modulators.aggregates.items():
+                assert population.get_aggregate(name)[i] == pytest.approx(aggregate.value, abs=1e-12), name
+            for name, emotion in emotions.emotions.items():
+                assert population.get_emotion(name)[i] == pytest.approx(emotion.value, abs=1e-12), name
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+from runner import Runner
+from simulation import Simulation
+
+
+def test_runner_stops_when_a_step_fails(monkeypatch):
+    simulation = Simulation(1)
+    step = simulation.step
+
+    def failing_step():
+        if simulation.current_simstep == 10:
+            raise KeyError("unknown event")
+        return step()
+
+    monkeypatch.setattr(simulation, "step", failing_step)
+    runner = Runner(simulation, speed=0)
+    runner.start()
+    runner.thread.join(timeout=10)
+    assert not runner.thread.is_alive()
+    assert not runner.running
+    assert isinstance(runner.error, KeyError)
+    assert simulation.current_simstep == 10
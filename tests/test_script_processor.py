@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from configuration import Settings
+from model import api
+from model.script_processor import Player, compile_script, parse_call
+from simulation import Simulation
+
+
+def at(step):
+    """The time of the script (in ms) at a simulation step"""
+    return step * Settings.update_milliseconds
+
+
+def make_schedule():
+    return compile_script([{"t": at(2), "e": at(6), "sub": "Hi", "x": 'create_event("lunch", "eat", 0.8, 0.9, 0.8, 50)'},
+                           {"t": at(4), "d": at(4), "sub": "Lunch?", "x": ['api.set_goal("lunch")']},
+                           {"t": at(8), "x": 'drop_event("lunch")'}])
+
+
+def state(player):
+    return dict(player.subtitles), [(event["id"], event["is_goal"]) for event in api.get_events()]
+
+
+def test_compiled_schedule_is_sorted_by_step():
+    schedule = make_schedule()
+    assert schedule.steps == [2, 2, 4, 4, 6, 8, 8]
+    assert [entry[1] for entry in schedule.entries[-2:]] == ["subtitle_end", "execute"]
+    assert schedule.subtitles_at(1) == {}
+    assert schedule.subtitles_at(5) == {0: "Hi", 1: "Lunch?"}
+    assert schedule.subtitles_at(6) == {1: "Lunch?"}
+    assert schedule.subtitles_at(8) == {}
+
+
+@pytest.mark.parametrize("source", ['os.system("ls")', 'consume(name)', 'consume("eat"', '"eat"'])
+def test_only_api_actions_with_literals_are_parsed(source):
+    with pytest.raises(ValueError):
+        parse_call(source)
+
+
+def test_advance_executes_the_entries_up_to_the_step():
+    Simulation(0)
+    player = Player(make_schedule())
+    assert player.advance(1) == []
+    assert len(player.advance(2)) == 2
+    assert state(player) == ({0: "Hi"}, [("lunch", False)])
+    player.advance(5)
+    assert state(player) == ({0: "Hi", 1: "Lunch?"}, [("lunch", True)])
+    player.advance(8)
+    assert state(player) == ({}, [])
+    assert player.next_step() is None
+
+
+def test_seeking_backwards_rebuilds_the_state():
+    Simulation(0)
+    player = Player(make_schedule())
+    history = []
+    for step in range(10):
+        player.advance(step)
+        history.append(state(player))
+
+    player.seek(5)  # backwards: the subtitles are restored, the api calls are not repeated
+    assert player.subtitles == history[5][0]
+    assert player.next_step() == 6
+
+    Simulation(0)
+    player.seek(1)  # replays the whole script on a fresh agent
+    assert player.subtitles == {}
+    for step in range(2, 10):
+        player.advance(step)
+        assert state(player) == history[step], step
+
+
+def test_seeking_forwards_skips_the_api_calls():
+    Simulation(0)
+    player = Player(make_schedule())
+    player.seek(4)
+    assert state(player) == ({0: "Hi", 1: "Lunch?"}, [])
+    player.advance(6)
+    assert player.subtitles == {1: "Lunch?"}
+
+
+def test_simulation_plays_the_script_from_the_current_step():
+    simulation = Simulation(0)
+    simulation.step()
+    simulation.play(make_schedule())
+    events = []
+    for _ in range(9):
+        simulation.step()
+        events.append([(event["id"], event["is_goal"]) for event in api.get_events()])
+    assert events[0] == events[1] == [("lunch", False)]  # after steps 2 and 3
+    assert events[2] == [("lunch", True)]
+    assert events[6] == []
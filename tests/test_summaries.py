@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from datalog import DataLog
+from simulation import Simulation
+from summaries import Pyramid, StreamingHistogram
+
+column = ("modulators", "valence", "value")
+
+
+@pytest.fixture(scope="module")
+def simulation():
+    simulation = Simulation(7)
+    simulation.log = DataLog(simulation, capacity=10000)
+    for _ in range(1500):
+        simulation.step()
+    pyramid = Pyramid(simulation.log, [column])  # from the recorded entries
+    simulation.log.add_writer(pyramid)
+    for _ in range(1537):
+        simulation.step()
+    simulation.pyramid = pyramid
+    return simulation
+
+
+@pytest.mark.parametrize("start, stop, buckets", [(0, None, 1000), (0, None, 10), (1000, 2000, 7), (1000, 1001, 5),
+                                                  (3, 3000, 100), (897, 3037, 33), (2048, 3037, 1), (5, 5, 10)])
+def test_pyramid_covers_exactly_the_range(simulation, start, stop, buckets):
+    values = simulation.log.get(*column)
+    all_steps = simulation.log.get_steps()
+    steps, minimum, maximum, mean = simulation.pyramid.get(column, buckets, start, stop)
+    stop = len(values) if stop is None else stop
+    if start >= stop:
+        assert len(steps) == 0
+        return
+    assert steps[0] == all_steps[start]
+    assert len(steps) <= 2 * buckets + 2
+    bounds = list(np.searchsorted(all_steps, steps)) + [stop]
+    assert bounds[0] == start
+    for i in range(len(steps)):
+        chunk = values[bounds[i]:bounds[i + 1]]
+        assert minimum[i] == chunk.min()
+        assert maximum[i] == chunk.max()
+        assert mean[i] == pytest.approx(chunk.mean(), abs=1e-12)
+
+
+def test_raw_level_holds_the_values_once(simulation):
+    level = simulation.pyramid.levels[0]
+    assert level.min is level.max is level.sum
+
+
+def test_histogram_counts_every_entry(simulation):
+    histogram = StreamingHistogram(simulation.log, column, bins=10, range=(-1, 1))
+    assert len(histogram) == len(simulation.log)
+    expected, _ = np.histogram(np.clip(simulation.log.get(*column), -1, 1 - 1e-12), bins=10, range=(-1, 1))
+    assert list(histogram.counts) == list(expected)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+import sweep
+
+space = {"needs.food.weight": (0.5, 2.0), "modulators.arousal.baseline": (0.1, 0.6)}
+
+
+def test_grid_covers_every_combination():
+    configurations = sweep.grid({"needs.water.weight": [0.5, 1.0, 2.0], "consumptions.eat.reward": [0.2, 0.8]})
+    assert len(configurations) == 6
+    assert configurations[0] == {"consumptions.eat.reward": 0.2, "needs.water.weight": 0.5}
+    assert len({tuple(sorted(c.items())) for c in configurations}) == 6
+
+
+def test_latin_hypercube_fills_every_stratum_once():
+    samples = 8
+    configurations = sweep.latin_hypercube(space, samples, seed=3)
+    assert configurations == sweep.latin_hypercube(space, samples, seed=3)
+    assert configurations != sweep.latin_hypercube(space, samples, seed=4)
+    for name, (low, high) in space.items():
+        values = np.array([c[name] for c in configurations])
+        strata = np.floor((values - low) / (high - low) * samples).astype(int)
+        assert sorted(strata) == list(range(samples)), name
+
+
+def test_random_design_is_reproducible():
+    configurations = sweep.random_design(space, 5, seed=1)
+    assert configurations == sweep.random_design(space, 5, seed=1)
+    for name, (low, high) in space.items():
+        assert all(low <= c[name] < high for c in configurations)
+
+
+def test_workers_return_the_same_results_as_a_single_process():
+    configurations = sweep.grid({"needs.food.weight": [0.5, 2.0], "modulators.arousal.baseline": [0.1, 0.4]})
+    weight, _ = sweep._resolve("needs.food.weight")
+    before = weight.weight
+    serial = sweep.run_sweep(configurations, 150, seeds=(0, 1), workers=1)
+    assert weight.weight == before  # the configurations are undone after each run
+    assert sweep.run_sweep(configurations, 150, seeds=(0, 1), workers=2) == serial
+    assert [(row["needs.food.weight"], row["modulators.arousal.baseline"], row["seed"]) for row in serial] == \
+        [(c["needs.food.weight"], c["modulators.arousal.baseline"], seed) for c in configurations for seed in (0, 1)]
+    assert serial[0]["modulator.arousal.mean"] != serial[2]["modulator.arousal.mean"]
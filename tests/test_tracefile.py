@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+import tracefile
+from datalog import DataLog
+from simulation import Simulation
+
+
+def test_recording_keeps_the_whole_run(tmp_path):
+    simulation = Simulation(2)
+    simulation.log = DataLog(simulation, capacity=100)
+    for _ in range(30):
+        simulation.step()
+    writer = tracefile.record(str(tmp_path / "run.trace"), simulation, chunk_size=64)
+    for _ in range(500):
+        simulation.step()
+    tracefile.stop_recording(writer, simulation)
+    simulation.step()
+
+    trace = tracefile.Trace(str(tmp_path / "run.trace"))
+    assert simulation.log.dropped() == 431
+    assert trace.header["dropped_entries"] == 0
+    assert np.array_equal(trace.get_steps(), np.arange(1, 531))
+    assert np.array_equal(trace.get("needs", "food")[-99:], simulation.log.get("needs", "food")[:-1])
+
+
+@pytest.mark.parametrize("dtype", ["<f8", "<f4"])
+def test_write_and_read_trace(tmp_path, dtype):
+    simulation = Simulation(6)
+    simulation.log = DataLog(simulation, capacity=64)
+    for _ in range(150):
+        simulation.step()
+    path = str(tmp_path / "run.trace")
+    tracefile.write_trace(path, simulation, chunk_size=10, dtype=dtype, metadata={"note": "test"})
+
+    trace = tracefile.read_trace(path)
+    log = simulation.log
+    assert trace.columns == log.columns
+    assert trace.data.dtype == np.dtype(dtype)
+    assert trace.metadata == {"note": "test"}
+    assert trace.header["seed"] == 6
+    assert trace.header["dropped_entries"] == 86
+    assert len(trace) == len(log) == 64
+    assert np.array_equal(trace.get_steps(), log.get_steps())
+    for category, element, field in log.columns:
+        expected = log.get(category, element, field).astype(dtype)
+        assert np.array_equal(trace.get(category, element, field), expected), (category, element, field)
+    if dtype == "<f8":
+        assert trace.get_entry(-1) == log.get_entry(-1)
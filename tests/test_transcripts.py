@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from model import transcripts
+
+script = ('t,e,text,action\n'
+          '0,1000,Hello,"create_event(\'lunch\', \'eat\', 0.8, 0.9, 0.8, (1, 2))"\n'
+          '00:00:02.000,00:00:03.000,Goodbye,"consume(\'eat\', tags={\'a\', \'b\'}); drop_goal()"\n')
+
+
+@pytest.fixture
+def script_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcripts, "cache_directory", str(tmp_path / "cache"))
+    path = tmp_path / "script.csv"
+    path.write_text(script)
+    return str(path)
+
+
+def test_cached_schedule_matches_the_compiled_one(script_path):
+    compiled = transcripts.load(script_path, use_cache=False)
+    transcripts.load(script_path)  # fills the cache
+    assert os.listdir(transcripts.cache_directory)
+    cached = transcripts.load(script_path)
+    assert cached.entries == compiled.entries
+    assert cached.origin == compiled.origin
+
+
+def test_failing_cache_writes_are_skipped(script_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError("read-only file system")
+
+    monkeypatch.setattr(transcripts.os, "replace", fail)
+    schedule = transcripts.load(script_path)
+    assert len(schedule) == 7
+    assert os.listdir(transcripts.cache_directory) == []
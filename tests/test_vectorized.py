@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from model import needs
+from model.population import Agent
+from model.vectorized import NeedEngine
+
+triggers = {0: [("eat", None, -1), ("sweat", None, -1)],
+            10: [("drink", None, -1), ("mate", 0.3, 2.0), ("mate", 0.2, 5.0)],
+            50: [("bruise", None, -1), ("success", None, -1), ("failure", None, -1)],
+            80: [("pride", 0.5, 1.0), ("shame", None, -1)]}
+
+
+@pytest.mark.parametrize("size", [None, 3])
+def test_engine_matches_object_path(size):
+    with Agent():
+        for need in needs.needs.values():
+            need.value = 0.3
+        engine = NeedEngine(size=size)
+        for step in range(400):
+            for name, reward, duration in triggers.get(step, ()):
+                needs.consumptions[name].trigger(reward, duration)
+                engine.trigger(name, reward, duration)
+            needs.update()
+            engine.update()
+
+        for i, need in enumerate(engine.needs):
+            for field in ("value", "pleasure", "pain", "urge", "urgency"):
+                values = getattr(engine, field)[..., i]
+                assert values == pytest.approx(getattr(need, field), abs=1e-12), (need.name, field)
+        for i, consumption in enumerate(engine.consumptions):
+            assert engine.consumption_value[..., i] == pytest.approx(consumption.value, abs=1e-12), consumption.name
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Binary trace files of the simulation.
+
+A trace file starts with a magic string, the length of the header and a JSON header, which describes the
+needs, consumptions, modulators, aggregates and emotions of the agent and the order of the columns.
+The header is padded to a multiple of 64 bytes, followed by the rows: the simulation step and the values
+of all columns, as little endian floats. Rows are appended in chunks while the simulation runs,
+and read_trace() memory-maps the file, so the columns can be read without loading the whole trace.
+"""
+
+__author__ = 'joscha'
+__date__ = '16.10.26'
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from configuration import Settings
+from model import api
+
+MAGIC = b"MMTRACE1"
+ALIGNMENT = 64
+
+
+class TraceWriter(object):
+    """Streams the entries of a DataLog into a trace file. Attach it with DataLog.add_writer(), or pass
+    entries to append() yourself; rows are buffered and written in chunks."""
+
+    def __init__(self, path, simulation, chunk_size=4096, dtype="<f8", metadata=None):
+        self.columns = simulation.log.columns
+        self.dtype = np.dtype(dtype)
+        header = {"columns": [list(column) for column in self.columns],
+                  "dtype": self.dtype.str,
+                  "update_milliseconds": Settings.update_milliseconds,
+                  "decimation": simulation.log.decimation,
+                  "dropped_entries": simulation.log.dropped(),  # entries the log had overwritten at the start
+                  "seed": simulation.seed,
+                  "trigger_probability": simulation.trigger_probability,
+                  "block_size": simulation.block_size,
+                  "schema": simulation.log.schema,
+                  "metadata": metadata or {}}
+        header = json.dumps(header).encode("utf-8")
+        padding = -(len(MAGIC) + 4 + len(header)) % ALIGNMENT
+        header += b" " * padding
+
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        self.buffer = np.zeros((chunk_size, len(self.columns) + 1), dtype=self.dtype)
+        self.buffered = 0
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, step, values):
+        """Add a single entry; values are in the order of the columns"""
+        row = self.buffer[self.buffered]
+        row[0] = step
+        row[1:] = values
+        self.buffered += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def append_block(self, steps, values):
+        """Add several entries; values is an array with one row per column"""
+        self.flush()
+        block = np.empty((len(steps), len(self.columns) + 1), dtype=self.dtype)
+        block[:, 0] = steps
+        block[:, 1:] = values.T
+        self.file.write(block.tobytes())
+        self.rows += len(steps)
+
+    def flush(self):
+        if self.buffered:
+            self.file.write(self.buffer[:self.buffered].tobytes())
+            self.rows += self.buffered
+            self.buffered = 0
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def _write_log(writer, log, chunk_size):
+    for start in range(0, len(log), chunk_size):
+        steps, values = log.get_block(start, start + chunk_size)
+        writer.append_block(steps, values)
+
+
+def write_trace(path, simulation, chunk_size=4096, dtype="<f8", metadata=None):
+    """Writes the current contents of the log of a simulation into a trace file, one chunk at a time.
+    The log only keeps its capacity of entries; see the dropped_entries of the header, and use record() to keep
+    a whole run."""
+    with TraceWriter(path, simulation, chunk_size, dtype, metadata) as writer:
+        _write_log(writer, simulation.log, chunk_size)
+
+
+def record(path, simulation, chunk_size=4096, dtype="<f8", metadata=None):
+    """Writes the current contents of the log of a simulation into a trace file, and streams every entry that is
+    recorded from now on into it. Returns the writer; stop the recording with stop_recording()."""
+    writer = TraceWriter(path, simulation, chunk_size, dtype, metadata)
+    _write_log(writer, simulation.log, chunk_size)
+    simulation.log.add_writer(writer)
+    return writer
+
+
+def stop_recording(writer, simulation):
+    simulation.log.remove_writer(writer)
+    writer.close()
+
+
+class Trace(object):
+    """A memory-mapped trace file; get() returns the values of a column without reading the whole file"""
+
+    def __init__(self, path):
+        with open(path, "rb") as trace_file:
+            if trace_file.read(len(MAGIC)) != MAGIC:
+                raise ValueError("%s is not a trace file" % path)
+            header_length = struct.unpack("<I", trace_file.read(4))[0]
+            self.header = json.loads(trace_file.read(header_length).decode("utf-8"))
+
+        self.columns = [tuple(column) for column in self.header["columns"]]
+        self.index = {column: i for i, column in enumerate(self.columns)}
+        dtype = np.dtype(self.header["dtype"])
+        offset = len(MAGIC) + 4 + header_length
+        row_size = dtype.itemsize * (len(self.columns) + 1)
+        rows = (os.path.getsize(path) - offset) // row_size  # ignore an incomplete last row
+        if rows:
+            self.data = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(rows, len(self.columns) + 1))
+        else:
+            self.data = np.zeros((0, len(self.columns) + 1), dtype=dtype)
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def schema(self):
+        return self.header["schema"]
+
+    @property
+    def metadata(self):
+        return self.header["metadata"]
+
+    def get_steps(self):
+        return self.data[:, 0]
+
+    def get(self, category, element, field="value"):
+        """Returns the values of a field of an element, e.g. get("needs", "food")"""
+        return self.data[:, self.index[(category, element, field)] + 1]
+
+    def get_entry(self, position, static=False):
+        """Returns a row as a dict of dicts, in the layout of api.get_data()"""
+        row = self.data[position]
+        return api.rehydrate(row[1:], dict(self.schema, columns=self.columns), int(row[0]), static)
+
+
+def read_trace(path):
+    return Trace(path)
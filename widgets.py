@@ -11,14 +11,23 @@ from tkinter import *
 from tkinter import ttk, filedialog, messagebox
 from configuration import Settings
 import math
-import json
 import colorsys
 
-import time
-
 import simulation
+import runner
+from model import api
+import plots
+import tracefile
+import datalog
+
+from helper_widgets import MainMenu, SimFrame, ConfigDialog, CanvasUpdater
 
-from helper_widgets import MainMenu, SimFrame, ConfigDialog
+
+def magnitude_color(value, hue):
+    """Returns a colour of the given hue, from white for 0 to fully saturated for 1 (in steps of 1%)"""
+    saturation = round(min(1.0, max(0.0, value)), 2)
+    r, g, b = colorsys.hsv_to_rgb(hue, saturation, 1.0)
+    return "#%02x%02x%02x" % (int(r * 255), int(g * 255), int(b * 255))
 
 
 class GuiApp(Tk):
@@ -37,7 +46,7 @@ class GuiApp(Tk):
         # menus
         self.option_add('*tearOff', FALSE)
         menubar = MainMenu(self)
-        for diagram in simulation.diagrams:
+        for diagram in plots.diagrams:
             key = diagram.key
             menubar.menu_plot.add_command(label="Plot " + key, command=lambda key=key: self.open_diagram(key))
         self.config(menu=menubar)
@@ -72,15 +81,21 @@ class GuiApp(Tk):
 
         # simulation thread
         self.running = False
+        self.runner = None
+        self.trace_writer = None  # streams the log into a trace file, see record_trace()
 
         self.reset_simulation()
 
     def open_diagram(self, key):
         """open a diagram window for the given type"""
         if key not in self.open_diagrams:
-            for Diagram in simulation.diagrams:
+            for Diagram in plots.diagrams:
                 if Diagram.key == key:
-                    self.open_diagrams[key] = Diagram(self, self.simulation)
+                    with self.runner.lock:  # the diagram may attach summaries to the log
+                        diagram = Diagram(self, self.simulation)
+                        sample = diagram.sample()
+                    diagram.draw_sample(sample)
+                    self.open_diagrams[key] = diagram
 
     def calculate_need_coordinates(self):
         """Arrange the needs in a circle on the canvas"""
@@ -138,18 +153,43 @@ class GuiApp(Tk):
         ConfigDialog(self)  # will call reset simulation for us
 
     def run_simulation(self):
-        """Starts a runner that will trigger simulation steps"""
+        """Starts a runner that will trigger simulation steps in the background, and the display updates"""
+        if self.running:
+            return
         self.status.set("running")
         self.running = True
-        while self.running:
-            self.simulation.step()
-            self.update_display_after_simstep()
-            self.update()
-            time.sleep(Settings.update_milliseconds / 1000)
+        self.runner.speed = Settings.speed
+        self.runner.start()
+        self.after(0, self.display_frame)
+
+    def display_frame(self):
+        """Shows the current state of the running simulation; reschedules itself at the display frame rate"""
+        if not self.running:
+            return
+        self.update_display_after_simstep(force_plots=False)
+        if not self.runner.running:  # the simulation has reached its last step, or failed
+            self.running = False
+            if self.runner.error is not None:
+                self.status.set("stopped by an error in step %d: %r" % (self.simulation.current_simstep + 1,
+                                                                       self.runner.error))
+            else:
+                self.status.set("finished")
+            return
+        steps_per_second = self.runner.steps_per_second
+        status = "running: %d steps/s (%.1fx real time)" % (steps_per_second,
+                                                            steps_per_second * Settings.update_milliseconds / 1000)
+        if api.instrumentation is not None:
+            with self.runner.lock:
+                status += " | " + api.instrumentation.describe()
+        if self.trace_writer is not None:
+            status += " | recording"
+        self.status.set(status)
+        self.after(max(1, int(1000 / Settings.frame_rate)), self.display_frame)
 
     def stop_simulation(self):
         """Pauses the runner that triggers simulation steps"""
         self.running = False
+        self.runner.stop()
         self.update_display_after_simstep()
         self.status.set("paused")
 
@@ -157,8 +197,17 @@ class GuiApp(Tk):
         """Initializes all values to original settings and sets up the canvas"""
 
         self.running = False
-
-        self.simulation = simulation.Simulation()  # the self parameter tells the sim where to find the gui
+        if self.runner:
+            self.runner.stop()
+            self.stop_recording()
+            self.simulation.close()
+
+        self.simulation = simulation.Simulation()
+        self.runner = runner.Runner(self.simulation, Settings.speed)
+        if Settings.instrumentation:
+            api.enable_instrumentation()
+        else:
+            api.disable_instrumentation()
 
         diagrams = list(self.open_diagrams.values())
         for plot in diagrams:
@@ -167,21 +216,65 @@ class GuiApp(Tk):
         self.setup_need_drawings()
 
         self.update_display_after_simstep()
-        self.status.set("ready to start")
+        self.status.set("ready to start (seed %d)" % self.simulation.seed)
 
     def step_simulation(self):
         """Advances the simulation by a single step"""
         self.running = False
+        self.runner.stop()
         self.status.set("step")
-        self.simulation.step()
+        self.runner.step()
         self.update_display_after_simstep()
         self.status.set("paused")
 
     def export_simulation_data(self):
-        file = filedialog.asksaveasfilename(defaultextension=".json")
-        if file is None:  # asksaveasfile return `None` if dialog closed with "cancel".
+        file = filedialog.asksaveasfilename(defaultextension=".trace",
+                                            filetypes=[("Binary trace", "*.trace"), ("JSON", "*.json")])
+        if not file:  # asksaveasfilename returns an empty string if the dialog is closed with "cancel"
+            return
+        with self.runner.lock:
+            self.write_simulation_data(file)
+            dropped = self.simulation.log.dropped()
+        if dropped:
+            messagebox.showwarning(title="Incomplete data",
+                                   message="The log keeps only the last %d entries, so the %d entries before them "
+                                           "are missing in the file (see dropped_entries in its header). Use "
+                                           "'Record to trace...' before running to save the whole run."
+                                           % (self.simulation.log.capacity, dropped))
+
+    def record_trace(self):
+        """Streams the log into a trace file from now on, after the entries that it holds already"""
+        file = filedialog.asksaveasfilename(defaultextension=".trace", filetypes=[("Binary trace", "*.trace")])
+        if not file:
+            return
+        self.stop_recording()
+        with self.runner.lock:
+            self.trace_writer = tracefile.record(file, self.simulation)
+        if not self.running:
+            self.status.set("recording to %s" % file)
+
+    def stop_recording(self):
+        if self.trace_writer is None:
+            return
+        with self.runner.lock:
+            tracefile.stop_recording(self.trace_writer, self.simulation)
+        self.trace_writer = None
+        if not self.running:
+            self.status.set("recording stopped")
+
+    def shutdown(self):
+        """Stops the simulation, and closes the trace file and the worker processes"""
+        self.running = False
+        self.runner.stop()
+        self.stop_recording()
+        self.simulation.close()
+
+    def write_simulation_data(self, file):
+        if not file.endswith(".json"):
+            tracefile.write_trace(file, self.simulation)
             return
-        open(file, 'w').write(json.dumps(self.simulation.log, sort_keys=True, indent=4))
+        with open(file, 'w') as export_file:
+            datalog.write_json(self.simulation.log, export_file)
 
     def export_plot(self):
         print("export diagram")
@@ -194,6 +287,7 @@ class GuiApp(Tk):
         c = self.simulator.canvas
         self.calculate_need_coordinates()
         self.simulator.canvas.delete(ALL)
+        self.canvas_updater = CanvasUpdater(c)
         radius = 10
         offset = 18
         self.need_drawings = []
@@ -256,42 +350,44 @@ class GuiApp(Tk):
             ])
 
 
-    def update_need_value_labels(self):
-        """paints the updated values on the canvas"""
-        for i, v in enumerate(self.simulation.needs):
-            values = [v.value, v.urge, v.pleasure, v.pain]
-            for index, value in enumerate(values):
-                self.simulator.canvas.itemconfig(self.need_value_labels[i][index], text=str(round(value, 3)))
-
-        for i, v in enumerate(self.simulation.modulators):
-            values = [v.value]
-            for index, value in enumerate(values):
-                self.simulator.canvas.itemconfig(self.modulator_value_labels[i][index], text=str(round(value, 3)))
-
-        for i, v in enumerate(self.simulation.consumptions):
-            values = [v.value]
-            for index, value in enumerate(values):
-                self.simulator.canvas.itemconfig(self.consumption_value_labels[i][index], text=str(round(value, 3)))
-
-        for i, v in enumerate(self.simulation.aggregates):
-            values = [v.value]
-            for index, value in enumerate(values):
-                self.simulator.canvas.itemconfig(self.aggregate_value_labels[i][index], text=str(round(value, 3)))
-
-        for i, v in enumerate(self.simulation.emotions):
-            values = [v.value]
-            for index, value in enumerate(values):
-                self.simulator.canvas.itemconfig(self.emotion_value_labels[i][index], text=str(round(value, 3)))
-
-    def update_display_after_simstep(self):
-        """Update gui display after every individual simulationstep"""
-        self.simulator.simstep.set(self.simulation.current_simstep)
-        self.update_need_value_labels()
-        self.update_plots()
-
-    def update_plots(self):
-        try:
-            for plot in self.open_diagrams.values():
-                plot.update_diagram()
-        except RuntimeError:  # thread hates it when we add new diagrams while running
-            pass
+    def get_display_values(self):
+        """Returns the values that are shown on the canvas, as lists per element, in the order of the labels"""
+        return {"step": self.simulation.current_simstep,
+                "needs": [[v.value, v.urge, v.pleasure, v.pain] for v in self.simulation.needs],
+                "modulators": [[v.value] for v in self.simulation.modulators],
+                "consumptions": [[v.value] for v in self.simulation.consumptions],
+                "aggregates": [[v.value] for v in self.simulation.aggregates],
+                "emotions": [[v.value] for v in self.simulation.emotions]}
+
+    def update_need_value_labels(self, display_values):
+        """paints the updated values on the canvas; only labels whose text changed are sent to Tk"""
+        updater = self.canvas_updater
+        for category, labels in (("needs", self.need_value_labels),
+                                 ("modulators", self.modulator_value_labels),
+                                 ("consumptions", self.consumption_value_labels),
+                                 ("aggregates", self.aggregate_value_labels),
+                                 ("emotions", self.emotion_value_labels)):
+            for i, values in enumerate(display_values[category]):
+                for index, value in enumerate(values):
+                    updater.set(labels[i][index], "text", str(round(value, 3)))
+
+        if Settings.color_values:
+            for i, values in enumerate(display_values["needs"]):
+                updater.set(self.need_drawings[i], "fill", magnitude_color(values[0], 0.54))  # light blue
+            for i, values in enumerate(display_values["emotions"]):
+                updater.set(self.emotion_drawings[i], "fill", magnitude_color(values[0], 0.0))  # red
+
+        updater.flush()
+
+    def update_display_after_simstep(self, force_plots=True):
+        """Update gui display with the current state of the simulation. The simulation may be running in the
+        background, so we copy the values while holding the lock of the runner, and draw them afterwards.
+        Unless forced, diagrams are only redrawn at their own frame rate."""
+        diagrams = [plot for plot in list(self.open_diagrams.values()) if plot.is_due(force_plots)]
+        with self.runner.lock:
+            display_values = self.get_display_values()
+            samples = [plot.sample() for plot in diagrams]
+        self.simulator.simstep.set(display_values["step"])
+        self.update_need_value_labels(display_values)
+        for plot, sample in zip(diagrams, samples):
+            plot.draw_sample(sample)